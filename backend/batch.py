@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import skin_to_litematic
+from skin_to_litematic import build_statue_data, get_block_faces, get_block_palette, load_skin
+from voxels import VoxelGrid
+
+
+def load_palette():
+    """Loads the block palette into this process once; matchers built from it are then cached per process."""
+    if not skin_to_litematic.BLOCK_PALETTE:
+        skin_to_litematic.BLOCK_PALETTE.update(get_block_palette())
+        skin_to_litematic.BLOCK_FACES.update(get_block_faces())
+
+
+def parallel_map(func, items, workers=None, initializer=None, chunksize=1):
+    """
+    ``func`` over ``items`` on a process pool of ``workers`` processes (None for one per CPU), in order.
+    ``workers=1`` runs everything in this process. Results are yielded as they come in order,
+    so callers that consume them one by one hold only a few at a time.
+    """
+    if workers == 1:
+        if initializer is not None:
+            initializer()
+        yield from map(func, items)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer) as pool:
+        yield from pool.map(func, items, chunksize=chunksize)
+
+
+def statue_grid(job):
+    """
+    The unscaled voxel grid of one skin, from a ``(path, build_statue_data options)`` job.
+
+    :raises ValueError: naming the skin, if it cannot be read
+    """
+    path, options = job
+    try:
+        skin = load_skin(path)
+    except ValueError as e:
+        raise ValueError(f"{os.path.basename(path)}: {e}") from e
+    return VoxelGrid.from_statue_blocks(build_statue_data(skin, **options))
+
+
+def statue_grids(paths, options=None, workers=None):
+    """
+    Converts many skins to voxel grids on a process pool, each worker loading the palette
+    and building its matchers once for all the skins it converts.
+    """
+    jobs = [(path, options or {}) for path in paths]
+    chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+    return parallel_map(statue_grid, jobs, workers, load_palette, chunksize)
@@ -0,0 +1,239 @@
+import argparse
+import glob
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+
+import litemapy
+import numpy as np
+from PIL import Image
+
+import skin_to_litematic
+from compression import open_compressed
+from export_formats import EXPORT_FORMATS, WRITERS, save_grid, write_grid, write_litematic_regions
+from fill_commands import merge_boxes, write_datapack
+from nbt_stream import NBTWriter
+from session import ConversionSession
+from skin_to_litematic import build_statue_data, get_block_palette, load_skin
+from voxels import VoxelGrid, block_state, intern_block_state, pack_bits
+
+DEFAULT_SCALES = (1, 2, 4, 8, 16)
+DEFAULT_PALETTE_SIZES = (256, 4096, 65536)
+SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "samples")
+
+# Largest volume still run through litemapy's per-voxel writer for comparison
+LITEMAPY_MAX_VOLUME = 1 << 21
+
+
+def random_skin(seed=0):
+    """A fully opaque noise skin, the worst case for palette size and run lengths."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(64, 64, 4), dtype=np.uint8)
+    pixels[..., 3] = 255
+    return Image.fromarray(pixels, "RGBA")
+
+
+class NullWriter:
+    """A file object discarding everything written to it."""
+
+    def write(self, data):
+        return len(data)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def traced(func, *args):
+    """Result, seconds and MiB allocated and still held by ``func``."""
+    tracemalloc.start()
+    try:
+        result, seconds = timed(func, *args)
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, held / 2 ** 20
+
+
+def litemapy_save(grid, path):
+    """The previous export path: one setblock per voxel, then litemapy's own per-voxel encoder."""
+    reg = litemapy.Region(0, 0, 0, grid.width, grid.height, grid.length)
+    for (x, y, z) in np.argwhere(grid.blocks).tolist():
+        reg[x, y, z] = block_state(grid.palette[grid.blocks[x, y, z]])
+    litemapy.Schematic(name="SkinStatue", author="Antigravity", regions={"Main": reg}).save(path)
+
+
+def bench_export(statue_blocks, scales, formats):
+    """Uncompressed encoding time, and total time and size of the gzipped file, per format."""
+    print(f"{'scale':>5} {'size':>15} {'blocks':>10} {'format':>10} {'encode s':>9} {'write s':>9} {'MiB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        base, grid_time = timed(VoxelGrid.from_statue_blocks, statue_blocks)
+        for scale in scales:
+            grid, scale_time = timed(base.scaled, scale)
+            size = f"{grid.width}x{grid.height}x{grid.length}"
+            print(f"{scale:>5} {size:>15} {grid.block_count():>10} {'grid':>10} {grid_time + scale_time:>9.3f}")
+            for fmt in formats:
+                path = os.path.join(tmp, "statue" + EXPORT_FORMATS[fmt])
+                _, encode_time = timed(write_grid, grid, NullWriter(), fmt)
+                _, write_time = timed(save_grid, grid, path, fmt)
+                mib = os.path.getsize(path) / 2 ** 20
+                print(f"{'':>5} {'':>15} {'':>10} {fmt:>10} {encode_time:>9.3f} {write_time:>9.3f} {mib:>8.2f}")
+            if "litematic" in formats and grid.volume <= LITEMAPY_MAX_VOLUME:
+                path = os.path.join(tmp, "litemapy.litematic")
+                _, total = timed(litemapy_save, grid, path)
+                print(f"{'':>5} {'':>15} {'':>10} {'litemapy':>10} {total:>9.3f} {'':>9} "
+                      f"{os.path.getsize(path) / 2 ** 20:>8.2f}")
+
+
+
+def bench_fill(statue_blocks, scales):
+    """Merged /fill commands against one setblock per block."""
+    print(f"{'scale':>5} {'setblocks':>10} {'commands':>9} {'reduction':>10} {'merge s':>8} {'datapack s':>10}")
+    base = VoxelGrid.from_statue_blocks(statue_blocks)
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in scales:
+            grid = base.scaled(scale)
+            boxes, merge_time = timed(merge_boxes, grid.blocks)
+            _, pack_time = timed(write_datapack, grid, os.path.join(tmp, "statue.zip"))
+            blocks = grid.block_count()
+            print(f"{scale:>5} {blocks:>10} {len(boxes):>9} {blocks / len(boxes):>9.1f}x {merge_time:>8.3f} "
+                  f"{pack_time:>10.3f}")
+
+
+
+def bench_compress(skins, scales, formats, levels, threads):
+    """Compression time and size of the encoded NBT per level and thread count, for each skin and scale."""
+    print(f"{'skin':>16} {'scale':>5} {'format':>10} {'raw MiB':>8} {'level':>5} {'threads':>7} {'seconds':>8} "
+          f"{'MiB':>7} {'ratio':>6}")
+    for skin_name, statue_blocks in skins:
+        base = VoxelGrid.from_statue_blocks(statue_blocks)
+        for scale in scales:
+            grid = base.scaled(scale)
+            for fmt in formats:
+                raw = io.BytesIO()
+                write_grid(grid, raw, fmt)
+                raw = raw.getvalue()
+                for level in levels:
+                    for count in threads:
+                        out = io.BytesIO()
+                        start = time.perf_counter()
+                        with open_compressed(out, level, count or None) as gz:
+                            gz.write(raw)
+                        seconds = time.perf_counter() - start
+                        size = len(out.getvalue())
+                        print(f"{skin_name[:16]:>16} {scale:>5} {fmt:>10} {len(raw) / 2 ** 20:>8.2f} {level:>5} "
+                              f"{count or os.cpu_count():>7} {seconds:>8.3f} {size / 2 ** 20:>7.2f} "
+                              f"{len(raw) / size:>6.1f}")
+
+
+def bench_regions(statue_blocks, scales, counts, threads):
+    """Uncompressed multi-region .litematic encoding time per region count and thread count."""
+    print(f"{'scale':>5} {'regions':>7} {'threads':>7} {'seconds':>8} {'speedup':>7}")
+    base = VoxelGrid.from_statue_blocks(statue_blocks)
+    for scale in scales:
+        grid = base.scaled(scale)
+        for count in counts:
+            regions = {f"Statue{i}": VoxelGrid(grid.blocks, grid.palette, (i * (grid.width + 1), 0, 0))
+                       for i in range(count)}
+            serial = None
+            for workers in threads:
+                _, seconds = timed(write_litematic_regions, regions, NBTWriter(NullWriter()), 0,
+                                   "SkinStatue", "Antigravity", workers or None)
+                serial = serial or seconds
+                print(f"{scale:>5} {count:>7} {workers or os.cpu_count():>7} {seconds:>8.3f} "
+                      f"{serial / seconds:>6.2f}x")
+
+
+def bench_session(skin_image, edits=200, texels=(1, 16, 256)):
+    """Applying random edits of a few texels through a ConversionSession, against a full conversion each time."""
+    print(f"{'texels':>6} {'edits':>6} {'session us':>11} {'full us':>9} {'speedup':>8}")
+    rng = np.random.default_rng(0)
+    session = ConversionSession(skin_image)
+    rgba = np.array(skin_image.convert("RGBA"))
+
+    def full(image):
+        grid = VoxelGrid.from_statue_blocks(build_statue_data(image))
+        return pack_bits(grid.yzx_indices(), grid.nbits())
+
+    for count in texels:
+        images = []
+        for _ in range(edits):
+            v, u = rng.integers(0, 64, (2, count))
+            rgba[v, u, :3] = rng.integers(0, 256, (count, 3))
+            images.append(Image.fromarray(rgba.copy(), "RGBA"))
+        _, incremental = timed(lambda: [session.update(image) for image in images])
+        _, rebuild = timed(lambda: [full(image) for image in images])
+        print(f"{count:>6} {edits:>6} {incremental / edits * 1e6:>11.0f} {rebuild / edits * 1e6:>9.0f} "
+              f"{rebuild / incremental:>7.1f}x")
+
+
+def bench_states(palette_sizes, voxels=1 << 18):
+    """
+    One BlockState per voxel the way per-voxel callers build them, fresh against interned:
+    creation time and memory, palette lookups, and NBT conversion of the palette.
+    """
+    print(f"{'palette':>7} {'states':>9} {'create s':>9} {'MiB':>7} {'lookup s':>9} {'to_nbt s':>9}")
+    rng = np.random.default_rng(0)
+    for size in palette_sizes:
+        keys = [(f"minecraft:block_{i}", {"facing": "north", "waterlogged": str(i % 2 == 0).lower()})
+                for i in range(size)]
+        picks = rng.integers(0, size, voxels).tolist()
+        for name, make in (("fresh", litemapy.BlockState), ("interned", intern_block_state)):
+            states, create_time, mib = traced(lambda: [make(keys[i][0], **keys[i][1]) for i in picks])
+            palette = list(dict.fromkeys(states))
+            index = {state: i for i, state in enumerate(palette)}
+            _, lookup_time = timed(lambda: [index[state] for state in states])
+            _, nbt_time = timed(lambda: [state.to_nbt() for state in palette])
+            print(f"{size:>7} {name:>9} {create_time:>9.3f} {mib:>7.1f} {lookup_time:>9.3f} {nbt_time:>9.3f}")
+
+
+if __name__ == "__main__":
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--skin", help="skin .png to benchmark with (default: a random noise skin)")
+    common.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="statue scales to run")
+    parser = argparse.ArgumentParser(description="Benchmarks of the statue pipeline on scaled statues.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", parents=[common], help="encode and write time per export format")
+    export_parser.add_argument("--formats", nargs="+", choices=WRITERS, default=list(WRITERS))
+    subparsers.add_parser("fill", parents=[common], help="/fill command count and generation time")
+    compress_parser = subparsers.add_parser("compress", parents=[common],
+                                            help="gzip time against size per level and thread count")
+    compress_parser.add_argument("--formats", nargs="+", choices=WRITERS, default=["litematic", "schem"])
+    compress_parser.add_argument("--levels", type=int, nargs="+", default=[1, 6, 9])
+    compress_parser.add_argument("--threads", type=int, nargs="+", default=[1, 0],
+                                 help="thread counts to compare, 0 for one per CPU")
+    compress_parser.add_argument("--samples", default=SAMPLES_DIR,
+                                 help=f"directory of skins to run when --skin is not given (default {SAMPLES_DIR})")
+    regions_parser = subparsers.add_parser("regions", parents=[common],
+                                           help="multi-region encoding time per region and thread count")
+    regions_parser.add_argument("--counts", type=int, nargs="+", default=[1, 4, 16, 64])
+    regions_parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 0],
+                                help="thread counts to compare, 0 for one per CPU")
+    subparsers.add_parser("session", parents=[common], help="incremental re-conversion of edited skins")
+    states_parser = subparsers.add_parser("states", help="fresh against interned BlockStates for large palettes")
+    states_parser.add_argument("--palette-sizes", type=int, nargs="+", default=DEFAULT_PALETTE_SIZES)
+    args = parser.parse_args()
+
+    if args.command == "states":
+        bench_states(args.palette_sizes)
+    elif args.command == "compress":
+        skin_to_litematic.BLOCK_PALETTE = get_block_palette()
+        paths = [args.skin] if args.skin else sorted(glob.glob(os.path.join(args.samples, "*.png")))
+        skins = [(os.path.basename(p), build_statue_data(load_skin(p))) for p in paths]
+        bench_compress(skins or [("random", build_statue_data(random_skin()))], args.scales, args.formats,
+                       args.levels, args.threads)
+    else:
+        skin_to_litematic.BLOCK_PALETTE = get_block_palette()
+        statue_blocks = build_statue_data(load_skin(args.skin) if args.skin else random_skin())
+        if args.command == "export":
+            bench_export(statue_blocks, args.scales, args.formats)
+        elif args.command == "fill":
+            bench_fill(statue_blocks, args.scales)
+        elif args.command == "session":
+            bench_session(load_skin(args.skin) if args.skin else random_skin())
+        elif args.command == "regions":
+            bench_regions(statue_blocks, args.scales, args.counts, args.threads)
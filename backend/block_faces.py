@@ -0,0 +1,186 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from matcher import BlockMatcher, quantize
+
+FACINGS = ("up", "down", "north", "south", "east", "west")
+
+# The six faces of a palette entry, as named in its "faces" and "variance" data
+CUBE_FACES = ("top", "bottom", "north", "south", "east", "west")
+
+# Brightness Minecraft applies to block faces depending on the direction they face
+FACE_SHADE = {"up": 1.0, "down": 0.5, "north": 0.8, "south": 0.8, "east": 0.6, "west": 0.6}
+
+_AXIS = {"up": "y", "down": "y", "north": "z", "south": "z", "east": "x", "west": "x"}
+_OPPOSITE = {"north": "south", "south": "north", "east": "west", "west": "east"}
+
+# Number of shared facing matcher sets kept in memory, and of restricted sets kept per shared set
+FACING_CACHE_SIZE = 8
+RESTRICTED_CACHE_SIZE = 16
+
+# Blocks whose "axis" state turns their end texture towards one pair of faces
+AXIS_KEYWORDS = ("_log", "_wood", "_stem", "_hyphae", "basalt", "hay_block", "bone_block", "quartz_pillar",
+                 "purpur_pillar", "froglight", "bamboo_block", "muddy_mangrove_roots", "minecraft:deepslate")
+# Blocks with a horizontal "facing" state and a distinct front texture
+FACING_KEYWORDS = ("furnace", "smoker", "carved_pumpkin", "jack_o_lantern")
+
+
+def block_orientation(block_id, entry):
+    """"axis", "facing" or None, from the palette entry if it says so, otherwise from the block id."""
+    if "orientation" in entry:
+        return entry["orientation"]
+    if any(block_id == k if ":" in k else k in block_id for k in AXIS_KEYWORDS):
+        return "axis"
+    if any(k in block_id for k in FACING_KEYWORDS):
+        return "facing"
+    return None
+
+
+def face_variance(entry, face=None):
+    """
+    Texture variance of one face of a palette entry (the average over its six faces if ``face`` is None),
+    with "side" standing in for faces the palette does not list, 0 when it provides no variance.
+    The aggregate "side" and "front" entries are not averaged in again next to the faces they summarize.
+    """
+    variance = entry.get("variance", {})
+    if face is None:
+        values = [variance.get(name, variance.get("side")) for name in CUBE_FACES]
+        values = [value for value in values if value is not None]
+        return sum(values) / len(values) if values else 0.0
+    if face in variance:
+        return variance[face]
+    if "side" in variance:
+        return variance["side"]
+    return face_variance(entry)
+
+
+def noise_penalties(palette, faces, weight):
+    """
+    Per-entry matching penalties, ``weight`` times the block's average texture variance, in palette order.
+    The weight is quantized first (see :func:`matcher.quantize`), so it takes few distinct values in matcher keys.
+    """
+    weight = quantize(weight)
+    return tuple(weight * face_variance(faces.get(block_id, {})) for block_id in palette.values())
+
+
+def visible_states(block_id, mean, entry, facing):
+    """
+    The block states worth considering for a voxel seen from ``facing``,
+    each with the unshaded color of the face the viewer sees and the name of that face.
+
+    :param mean:    the block's average color, used for faces the entry does not describe
+    :param entry:   per-face colors of the block ("top", "bottom", "side", "front"), possibly empty
+    """
+    faces = entry.get("faces", {})
+    side = faces.get("side", mean)
+    top = faces.get("top", side)
+    bottom = faces.get("bottom", top)
+    orientation = block_orientation(block_id, entry)
+    if orientation == "axis":
+        along = _AXIS[facing]
+        across = "y" if along != "y" else "x"
+        return [(f"{block_id}[axis={along}]", top, "top"), (f"{block_id}[axis={across}]", side, "side")]
+    if orientation == "facing":
+        if facing == "up":
+            return [(f"{block_id}[facing=north]", top, "top")]
+        if facing == "down":
+            return [(f"{block_id}[facing=north]", bottom, "bottom")]
+        front = faces.get("front", side)
+        return [(f"{block_id}[facing={facing}]", front, "front"),
+                (f"{block_id}[facing={_OPPOSITE[facing]}]", side, "side")]
+    if facing == "up":
+        return [(block_id, top, "top")]
+    if facing == "down":
+        return [(block_id, bottom, "bottom")]
+    return [(block_id, faces.get(facing, side), facing if facing in faces else "side")]
+
+
+class FacingMatchers:
+    """
+    One :class:`~matcher.BlockMatcher` per facing, matching against the shaded color of the block face
+    a viewer looking at that side of the statue actually sees.
+    Matched ids are block state identifiers such as ``minecraft:oak_log[axis=y]``.
+    """
+
+    def __init__(self, matchers, base_ids):
+        self.matchers = matchers
+        self.base_ids = base_ids
+        self._restricted = OrderedDict()
+
+    @classmethod
+    def build(cls, palette, faces, shading=1.0, noise_weight=0.0):
+        """
+        :param palette:         ``{(r, g, b): block_id}``
+        :param faces:           ``{block_id: entry}`` with per-face colors for the blocks that have them
+        :param shading:         0 ignores directional shading, 1 applies the full in-game face shading
+        :param noise_weight:    penalty per unit of texture variance of the visible face
+        """
+        matchers, base_ids = {}, {}
+        for facing in FACINGS:
+            shade = 1.0 - shading * (1.0 - FACE_SHADE[facing])
+            colors, ids, bases, penalties = [], [], [], []
+            for mean, block_id in palette.items():
+                entry = faces.get(block_id, {})
+                for state, color, face in visible_states(block_id, mean, entry, facing):
+                    colors.append(np.asarray(color, dtype=np.float32) * shade)
+                    ids.append(state)
+                    bases.append(block_id)
+                    penalties.append(noise_weight * face_variance(entry, face))
+            matchers[facing] = BlockMatcher(colors, ids, penalties if noise_weight else None)
+            base_ids[facing] = bases
+        return cls(matchers, base_ids)
+
+    def __getitem__(self, facing):
+        return self.matchers[facing]
+
+    def restrict(self, block_ids):
+        """
+        Matchers limited to the states of the given blocks, shared (with their LUTs) between calls
+        for the same blocks; the RESTRICTED_CACHE_SIZE most recently used sets are kept.
+        """
+        allowed = frozenset(block_ids)
+        restricted = self._restricted.get(allowed)
+        if restricted is not None:
+            self._restricted.move_to_end(allowed)
+            return restricted
+        matchers, base_ids = {}, {}
+        for facing, matcher in self.matchers.items():
+            keep = [i for i, base in enumerate(self.base_ids[facing]) if base in allowed]
+            matchers[facing] = matcher.subset(keep)
+            base_ids[facing] = [self.base_ids[facing][i] for i in keep]
+        restricted = FacingMatchers(matchers, base_ids)
+        self._restricted[allowed] = restricted
+        if len(self._restricted) > RESTRICTED_CACHE_SIZE:
+            self._restricted.popitem(last=False)
+        return restricted
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+_FACING_MATCHERS = OrderedDict()
+
+
+def get_facing_matchers(palette, faces, shading=1.0, noise_weight=0.0):
+    """
+    Shared :class:`FacingMatchers` for a palette, its face data, a shading strength and a noise weight,
+    the last two quantized (see :func:`matcher.quantize`); the FACING_CACHE_SIZE most recently used are kept.
+    """
+    shading, noise_weight = quantize(shading), quantize(noise_weight)
+    key = (tuple((color, block_id, _freeze(faces.get(block_id))) for color, block_id in palette.items()),
+           shading, noise_weight)
+    matchers = _FACING_MATCHERS.get(key)
+    if matchers is None:
+        matchers = FacingMatchers.build(palette, faces, shading, noise_weight)
+        _FACING_MATCHERS[key] = matchers
+        if len(_FACING_MATCHERS) > FACING_CACHE_SIZE:
+            _FACING_MATCHERS.popitem(last=False)
+    else:
+        _FACING_MATCHERS.move_to_end(key)
+    return matchers
@@ -0,0 +1,269 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from fetch_palette import EXCLUDED_KEYWORDS
+
+OUTPUT_FILE = "block_palette.json"
+CACHE_FILE = "palette_cache.json"
+
+# Minimum average alpha over every face for a block to count as solid
+MIN_COVERAGE = 0.999
+
+FACE_NAMES = {"up": "top", "down": "bottom", "north": "north", "south": "south", "east": "east", "west": "west"}
+HORIZONTAL = ("north", "south", "east", "west")
+
+
+class ResourcePack:
+    """Read-only access to a resource pack (or client jar) given as a directory or a zip file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = None if os.path.isdir(path) else zipfile.ZipFile(path)
+
+    def names(self, prefix):
+        if self._zip is not None:
+            return sorted(n for n in self._zip.namelist() if n.startswith(prefix) and not n.endswith("/"))
+        root = os.path.join(self.path, prefix)
+        if not os.path.isdir(root):
+            return []
+        return sorted(prefix + name for name in os.listdir(root) if os.path.isfile(os.path.join(root, name)))
+
+    def read(self, name):
+        try:
+            if self._zip is not None:
+                return self._zip.read(name)
+            with open(os.path.join(self.path, name), 'rb') as f:
+                return f.read()
+        except (KeyError, FileNotFoundError):
+            return None
+
+    def read_json(self, name):
+        data = self.read(name)
+        return None if data is None else json.loads(data)
+
+
+def _asset_path(ref, kind, extension):
+    namespace, _, path = ref.rpartition(":")
+    return f"assets/{namespace or 'minecraft'}/{kind}/{path}{extension}"
+
+
+def _resolve_model(pack, ref, cache):
+    """Flattens a model's parent chain into (textures, elements)."""
+    if ref in cache:
+        return cache[ref]
+    model = pack.read_json(_asset_path(ref, "models", ".json"))
+    if model is None:
+        cache[ref] = ({}, None)
+        return cache[ref]
+    textures, elements = {}, None
+    if "parent" in model:
+        textures, elements = _resolve_model(pack, model["parent"], cache)
+        textures = dict(textures)
+    textures.update(model.get("textures", {}))
+    if "elements" in model:
+        elements = model["elements"]
+    cache[ref] = (textures, elements)
+    return cache[ref]
+
+
+def _resolve_texture(textures, ref):
+    seen = set()
+    while ref.startswith("#"):
+        if ref in seen:
+            return None
+        seen.add(ref)
+        ref = textures.get(ref[1:], "")
+    return ref or None
+
+
+def _default_variant(blockstate):
+    """The first variant without rotation (or the first variant), or None for multipart blocks."""
+    variants = blockstate.get("variants")
+    if not variants:
+        return None, None
+    keys = sorted(variants)
+    for key in keys:
+        model = variants[key][0] if isinstance(variants[key], list) else variants[key]
+        if not model.get("x") and not model.get("y"):
+            return key, model
+    key = keys[0]
+    return key, variants[key][0] if isinstance(variants[key], list) else variants[key]
+
+
+def _orientation(blockstate):
+    keys = " ".join(blockstate.get("variants", {}))
+    if "axis=" in keys:
+        return "axis"
+    if "facing=" in keys and "facing=up" not in keys:
+        return "facing"
+    return None
+
+
+def cube_face_textures(pack, blockstate, model_cache):
+    """
+    Texture references for the six faces of a full-cube block, or None if the block is not a plain full cube.
+    """
+    _, variant = _default_variant(blockstate)
+    if variant is None:
+        return None
+    textures, elements = _resolve_model(pack, variant["model"], model_cache)
+    if not elements or len(elements) != 1:
+        return None
+    element = elements[0]
+    if element.get("from") != [0, 0, 0] or element.get("to") != [16, 16, 16]:
+        return None
+    faces = {}
+    for direction, face in element.get("faces", {}).items():
+        if "tintindex" in face:
+            return None
+        texture = _resolve_texture(textures, face.get("texture", ""))
+        if texture is None:
+            return None
+        faces[direction] = texture
+    if set(faces) != set(FACE_NAMES):
+        return None
+    return faces
+
+
+def texture_stats(data):
+    """
+    Mean color, color variance and alpha coverage of a texture,
+    computed from its first animation frame.
+    Colors are weighted by alpha; variance is the mean squared distance to the mean color.
+    """
+    pixels = np.asarray(Image.open(io.BytesIO(data)).convert("RGBA"), dtype=np.float64)
+    pixels = pixels[:pixels.shape[1]]
+    rgb = pixels[..., :3].reshape(-1, 3)
+    weights = pixels[..., 3].ravel() / 255.0
+    total = weights.sum()
+    if total == 0:
+        return {"mean": [0, 0, 0], "variance": 0.0, "coverage": 0.0}
+    mean = weights @ rgb / total
+    variance = weights @ ((rgb - mean) ** 2).sum(axis=1) / total
+    return {
+        "mean": [int(round(c)) for c in mean],
+        "variance": round(float(variance), 2),
+        "coverage": round(float(total / len(weights)), 4),
+    }
+
+
+def _hashed_stats(item):
+    digest, data = item
+    return digest, texture_stats(data)
+
+
+def load_cache(path):
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def compute_texture_stats(pack, texture_refs, cache, workers=None):
+    """
+    Stats for every texture reference, reusing cached results by texture content hash
+    and computing the rest on a process pool.
+
+    :returns: ({texture_ref: stats}, {hash: stats} for the textures used)
+    """
+    hashes, pending = {}, {}
+    for ref in sorted(texture_refs):
+        data = pack.read(_asset_path(ref, "textures", ".png"))
+        if data is None:
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        hashes[ref] = digest
+        if digest not in cache:
+            pending[digest] = data
+    computed = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            computed = dict(executor.map(_hashed_stats, sorted(pending.items()), chunksize=16))
+    used = {digest: cache.get(digest) or computed[digest] for digest in hashes.values()}
+    return {ref: used[digest] for ref, digest in hashes.items()}, used
+
+
+def build_palette(pack_path, cache_path=CACHE_FILE, workers=None):
+    """
+    Builds the compiled palette from a resource pack without any network access.
+
+    :returns: the palette as written to block_palette.json
+    """
+    pack = ResourcePack(pack_path)
+    prefix = "assets/minecraft/blockstates/"
+    model_cache = {}
+    blocks = {}
+    for name in pack.names(prefix):
+        block_name = name[len(prefix):-len(".json")]
+        if any(keyword in block_name for keyword in EXCLUDED_KEYWORDS):
+            continue
+        blockstate = pack.read_json(name)
+        faces = cube_face_textures(pack, blockstate, model_cache)
+        if faces is not None:
+            blocks[block_name] = (faces, _orientation(blockstate))
+    print(f"Found {len(blocks)} full-cube blocks.")
+
+    cache = load_cache(cache_path)
+    texture_refs = {ref for faces, _ in blocks.values() for ref in faces.values()}
+    stats, used = compute_texture_stats(pack, texture_refs, cache, workers)
+    print(f"Computed {len(set(used) - set(cache))} textures, reused {len(set(used) & set(cache))} from cache.")
+    if cache_path:
+        with open(cache_path, 'w') as f:
+            json.dump(used, f, indent=1, sort_keys=True)
+
+    palette = {}
+    for block_name, (faces, orientation) in sorted(blocks.items()):
+        if any(ref not in stats for ref in faces.values()):
+            continue
+        face_stats = {FACE_NAMES[direction]: stats[ref] for direction, ref in faces.items()}
+        if min(s["coverage"] for s in face_stats.values()) < MIN_COVERAGE:
+            continue
+        means = np.array([s["mean"] for s in face_stats.values()], dtype=np.float64)
+        # The default variant of a "facing" block faces north, so its north face is the front
+        side_names = [d for d in HORIZONTAL if orientation != "facing" or d != "north"]
+        sides = np.array([face_stats[d]["mean"] for d in side_names], dtype=np.float64)
+        entry = {
+            "id": f"minecraft:{block_name}",
+            "faces": {name: s["mean"] for name, s in sorted(face_stats.items())},
+            "variance": {name: s["variance"] for name, s in sorted(face_stats.items())},
+            "coverage": {name: s["coverage"] for name, s in sorted(face_stats.items())},
+        }
+        entry["faces"]["side"] = [int(round(c)) for c in sides.mean(axis=0)]
+        entry["variance"]["side"] = round(float(np.mean([face_stats[d]["variance"] for d in side_names])), 2)
+        if orientation is not None:
+            entry["orientation"] = orientation
+            if orientation == "facing":
+                entry["faces"]["front"] = face_stats["north"]["mean"]
+                entry["variance"]["front"] = face_stats["north"]["variance"]
+        r, g, b = (int(round(c)) for c in means.mean(axis=0))
+        palette[f"{r},{g},{b}"] = entry
+    return palette
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build block_palette.json from a local resource pack or client jar.")
+    parser.add_argument("pack", help="resource pack directory, .zip or Minecraft client .jar")
+    parser.add_argument("-o", "--output", default=OUTPUT_FILE, help=f"output palette file (default {OUTPUT_FILE})")
+    parser.add_argument("--cache", default=CACHE_FILE,
+                        help=f"texture stats cache keyed by file hash (default {CACHE_FILE}, empty to disable)")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.pack):
+        print(f"Error: {args.pack} not found.")
+        sys.exit(1)
+
+    palette = build_palette(args.pack, args.cache or None, args.workers)
+    print(f"Found {len(palette)} suitable solid blocks.")
+    with open(args.output, 'w') as f:
+        json.dump(palette, f, indent=2)
+    print(f"Saved palette to {args.output}")
@@ -0,0 +1,103 @@
+import gzip
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+# gzip's own default; lower levels trade size for speed
+DEFAULT_COMPRESSLEVEL = 9
+
+# Uncompressed bytes per independently compressed block of the parallel writer
+BLOCK_SIZE = 1 << 20
+
+# Grids from this many voxels up are worth compressing on several threads in "auto" mode
+PARALLEL_MIN_VOLUME = 1 << 22
+
+# Window kept from the previous block as a preset dictionary, so block boundaries barely cost ratio
+_DICT_SIZE = 1 << 15
+
+
+def _deflate_block(data, level, zdict, last):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict) if zdict \
+        else zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class ParallelGzipWriter:
+    """
+    A writable file object producing a single valid gzip member, compressing BLOCK_SIZE blocks on a thread pool
+    (zlib releases the GIL). Each block is raw deflate ending on a byte boundary (Z_SYNC_FLUSH, Z_FINISH for
+    the last one) primed with the end of the previous block, and the trailer carries the CRC32 and size
+    of the whole stream, the way pigz does it.
+    """
+
+    def __init__(self, fileobj, compresslevel=DEFAULT_COMPRESSLEVEL, threads=None, mtime=None):
+        self.fileobj = fileobj
+        self.level = compresslevel
+        threads = threads or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._max_pending = 2 * threads
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._previous = b""
+        self._crc = 0
+        self._size = 0
+        self.closed = False
+        flags = 2 if compresslevel >= 9 else 4 if compresslevel == 1 else 0
+        mtime = int(time()) if mtime is None else int(mtime)
+        fileobj.write(struct.pack("<BBBBIBB", 0x1F, 0x8B, 8, 0, mtime & 0xFFFFFFFF, flags, 255))
+
+    def _submit(self, block, last):
+        self._crc = zlib.crc32(block, self._crc)
+        self._size += len(block)
+        zdict = self._previous[-_DICT_SIZE:]
+        self._previous = block
+        self._pending.append(self._executor.submit(_deflate_block, block, self.level, zdict, last))
+        while len(self._pending) > (0 if last else self._max_pending):
+            self.fileobj.write(self._pending.popleft().result())
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= BLOCK_SIZE:
+            block = bytes(self._buffer[:BLOCK_SIZE])
+            del self._buffer[:BLOCK_SIZE]
+            self._submit(block, last=False)
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self._submit(bytes(self._buffer), last=True)
+        self._executor.shutdown()
+        self.fileobj.write(struct.pack("<II", self._crc & 0xFFFFFFFF, self._size & 0xFFFFFFFF))
+        self.closed = True
+
+    def abort(self):
+        """Stops the compression threads without writing the trailer, leaving an incomplete gzip stream."""
+        if self.closed:
+            return
+        self._executor.shutdown(cancel_futures=True)
+        self._pending.clear()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def open_compressed(fileobj, compresslevel=DEFAULT_COMPRESSLEVEL, threads=1, mtime=None):
+    """
+    A writable gzip stream over ``fileobj``: the standard single-threaded GzipFile,
+    or a :class:`ParallelGzipWriter` when ``threads`` is greater than 1 (None for one per CPU).
+    No file name is stored in the header; ``mtime`` defaults to the current time.
+    """
+    if threads is not None and threads <= 1:
+        return gzip.GzipFile(filename="", fileobj=fileobj, mode="wb", compresslevel=compresslevel, mtime=mtime)
+    return ParallelGzipWriter(fileobj, compresslevel, threads, mtime)
@@ -0,0 +1,125 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from matcher import ALPHA_THRESHOLD
+
+DITHER_MODES = ("none", "ordered", "floyd-steinberg")
+
+# Number of dithered textures kept in memory, keyed by content hash
+DITHER_CACHE_SIZE = 256
+
+_BAYER_4 = np.array([
+    [0, 8, 2, 10],
+    [12, 4, 14, 6],
+    [3, 11, 1, 9],
+    [15, 7, 13, 5],
+], dtype=np.float32)
+
+_cache = OrderedDict()
+
+
+def _local_coordinates(shape, rects):
+    """Per-texel coordinates relative to the face rectangle that contains it."""
+    local_u = np.zeros(shape, dtype=np.int32)
+    local_v = np.zeros(shape, dtype=np.int32)
+    inside = np.zeros(shape, dtype=bool)
+    for u, v, w, h in rects:
+        local_u[v:v + h, u:u + w] = np.arange(w)[None, :]
+        local_v[v:v + h, u:u + w] = np.arange(h)[:, None]
+        inside[v:v + h, u:u + w] = True
+    return local_u, local_v, inside
+
+
+def ordered_dither(rgba, rects, matcher, strength=1.0):
+    """
+    Ordered (Bayer) dithering of every face rectangle at once.
+    The threshold pattern restarts at the corner of each face so it lines up on the statue.
+
+    :returns: palette indices shaped like the texture, -1 for transparent texels and texels outside any face
+    """
+    local_u, local_v, inside = _local_coordinates(rgba.shape[:2], rects)
+    thresholds = _BAYER_4[local_v % 4, local_u % 4]
+    offset = ((thresholds + 0.5) / 16.0 - 0.5) * (matcher.spacing() * strength)
+    rgb = np.clip(np.rint(rgba[..., :3].astype(np.float32) + offset[..., None]), 0, 255).astype(np.uint8)
+    indices = matcher.match(rgb)
+    indices[~inside | (rgba[..., 3] < ALPHA_THRESHOLD)] = -1
+    return indices
+
+
+def floyd_steinberg(rgba, matcher):
+    """
+    Floyd-Steinberg error diffusion over a batch of equally sized faces (B, H, W, 4).
+
+    Faces are processed together, one texel column at a time within each row,
+    and the error pushed to the next row is spread with whole-row array operations.
+    Transparent texels neither receive nor emit error.
+
+    :returns: palette indices (B, H, W), -1 for transparent texels
+    """
+    batch, height, width = rgba.shape[:3]
+    work = rgba[..., :3].astype(np.float32)
+    opaque = rgba[..., 3] >= ALPHA_THRESHOLD
+    indices = np.full((batch, height, width), -1, dtype=np.int32)
+    for y in range(height):
+        row = work[:, y]
+        row_opaque = opaque[:, y]
+        errors = np.zeros((batch, width, 3), dtype=np.float32)
+        for x in range(width):
+            color = np.clip(row[:, x], 0, 255)
+            chosen = matcher.nearest(color)
+            mask = row_opaque[:, x]
+            indices[:, y, x] = np.where(mask, chosen, -1)
+            err = (color - matcher.colors[chosen]) * mask[:, None]
+            errors[:, x] = err
+            if x + 1 < width:
+                row[:, x + 1] += err * (7 / 16) * row_opaque[:, x + 1, None]
+        if y + 1 < height:
+            below = np.zeros((batch, width, 3), dtype=np.float32)
+            below[:, 1:] += errors[:, :-1] * (3 / 16)
+            below += errors * (5 / 16)
+            below[:, :-1] += errors[:, 1:] * (1 / 16)
+            work[:, y + 1] += below * opaque[:, y + 1, :, None]
+    return indices
+
+
+def dither_texture(rgba, rects, matcher, mode, strength=1.0):
+    """
+    Maps every face rectangle of a texture to palette indices using the given dithering mode.
+    Each face is dithered on its own so that error never bleeds across a face edge.
+    Results are cached by the texture content, the face layout, the mode and the palette.
+
+    :param rgba:    uint8 texture (H, W, 4)
+    :param rects:   face rectangles as (u, v, width, height), non-overlapping
+    :returns:       read-only palette indices (H, W), -1 for transparent texels and texels outside any face
+    """
+    if mode not in DITHER_MODES or mode == "none":
+        raise ValueError(f"Unknown dithering mode: {mode}")
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    digest = hashlib.sha1(rgba.tobytes())
+    digest.update(repr((rgba.shape, tuple(rects), mode, strength, matcher.key)).encode("utf-8"))
+    key = digest.hexdigest()
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        return cached
+
+    if mode == "ordered":
+        indices = ordered_dither(rgba, rects, matcher, strength)
+    else:
+        indices = np.full(rgba.shape[:2], -1, dtype=np.int32)
+        by_shape = {}
+        for rect in rects:
+            by_shape.setdefault((rect[2], rect[3]), []).append(rect)
+        for (w, h), group in by_shape.items():
+            batch = np.stack([rgba[v:v + h, u:u + w] for u, v, _, _ in group])
+            result = floyd_steinberg(batch, matcher)
+            for (u, v, _, _), face in zip(group, result):
+                indices[v:v + h, u:u + w] = face
+
+    indices.setflags(write=False)
+    _cache[key] = indices
+    if len(_cache) > DITHER_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return indices
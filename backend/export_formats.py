@@ -0,0 +1,279 @@
+import os
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil, log2
+from time import time
+
+import numpy as np
+from litemapy.info import LITEMATIC_SUBVERSION, LITEMATIC_VERSION, MC_DATA_VERSION, SPONGE_VERSION
+from nbtlib.tag import ByteArray, Compound, Int, IntArray, List, Long, LongArray, Short, String
+
+from compression import DEFAULT_COMPRESSLEVEL, PARALLEL_MIN_VOLUME, open_compressed
+from fill_commands import write_datapack
+from nbt_stream import NBTWriter
+from voxels import PACK_CHUNK, ChunkedGrid, block_state, encode_varints, iter_packed_words, packed_length, varint_size
+
+# Output formats and their file extensions
+EXPORT_FORMATS = {
+    "litematic": ".litematic",  # Litematica
+    "schem": ".schem",          # Sponge schematic v2 (WorldEdit, FAWE)
+    "nbt": ".nbt",              # vanilla structure block / /place template
+    "datapack": ".zip",         # datapack of /fill functions, for servers without mods
+}
+
+SCHEMATIC_NAME = "SkinStatue"
+SCHEMATIC_AUTHOR = "Antigravity"
+REGION_NAME = "Main"
+
+
+def _xyz(name, x, y, z):
+    return name, Compound({"x": Int(x), "y": Int(y), "z": Int(z)})
+
+
+def _write_litematic_header(nbt, size, region_count, total_blocks, total_volume, timestamp, name, author,
+                            preview=None, source=None):
+    """
+    ``source``: root entries of a loaded .litematic whose description and creation time are kept. The data version
+    is always MC_DATA_VERSION, the version the written block ids target.
+    """
+    now = round(time() * 1000) if timestamp is None else timestamp
+    metadata = (source or {}).get("Metadata", {})
+    nbt.tag("Version", Int(LITEMATIC_VERSION))
+    nbt.tag("SubVersion", Int(LITEMATIC_SUBVERSION))
+    nbt.tag("MinecraftDataVersion", Int(MC_DATA_VERSION))
+    with nbt.compound("Metadata"):
+        nbt.tag(*_xyz("EnclosingSize", *size))
+        nbt.tag("Author", String(author))
+        nbt.tag("Description", String(metadata.get("Description", "")))
+        nbt.tag("Name", String(name))
+        nbt.tag("RegionCount", Int(region_count))
+        nbt.tag("TimeCreated", Long(metadata.get("TimeCreated", now)))
+        nbt.tag("TimeModified", Long(now))
+        nbt.tag("TotalBlocks", Int(total_blocks))
+        nbt.tag("TotalVolume", Int(total_volume))
+        nbt.tag("PreviewImageData", IntArray([] if preview is None else preview))
+
+
+def _write_litematic_region(nbt, name, position, size, palette, nbits, words):
+    with nbt.compound(name):
+        nbt.tag(*_xyz("Position", *position))
+        nbt.tag(*_xyz("Size", *size))
+        nbt.tag("BlockStatePalette", List[Compound]([block_state(i).to_nbt() for i in palette]))
+        for key in ("Entities", "TileEntities", "PendingBlockTicks", "PendingFluidTicks"):
+            nbt.tag(key, List[Compound]())
+        nbt.array("BlockStates", LongArray, packed_length(int(np.prod(size)), nbits),
+                  (w.view(np.int64) for w in words))
+
+
+def write_litematic(grid, nbt, timestamp=None, name=SCHEMATIC_NAME, author=SCHEMATIC_AUTHOR, words=None,
+                    preview=None):
+    """
+    A single-region Litematica schematic, with the block states bit-packed slab by slab.
+    ``timestamp`` (milliseconds) is the creation time recorded, the current time by default.
+    ``words`` are the grid's block states already packed with :func:`voxels.pack_bits`, if the caller keeps them.
+    ``preview`` is the thumbnail's ARGB pixels (see :func:`preview.preview_image_data`), none by default.
+    """
+    with nbt.compound():
+        _write_litematic_header(nbt, (grid.width, grid.height, grid.length), 1, grid.block_count(), grid.volume,
+                                timestamp, name, author, preview)
+        with nbt.compound("Regions"):
+            nbits = grid.nbits()
+            words = iter_packed_words(grid.iter_yzx(), nbits) if words is None else [words]
+            _write_litematic_region(nbt, REGION_NAME, (0, 0, 0), (grid.width, grid.height, grid.length),
+                                    grid.palette, nbits, words)
+
+
+def encode_region(grid, scale=1):
+    """
+    The palette of one region with its unused entries dropped (air stays first), and its bit-packed block states,
+    with every voxel scaled to a ``scale``³ cube on the fly.
+    The work runs in NumPy kernels that release the GIL, so regions encode concurrently on threads.
+
+    :returns: (palette, nbits, uint64 words)
+    """
+    if scale > 1:
+        grid = ChunkedGrid.from_grid(grid, scale)
+    counts = np.zeros(len(grid.palette), dtype=np.int64)
+    for values in grid.iter_yzx():
+        counts += np.bincount(values, minlength=len(grid.palette))
+    used = counts > 0
+    used[0] = True
+    lut = (np.cumsum(used) - 1).astype(np.uint32)
+    palette = [identifier for identifier, u in zip(grid.palette, used) if u]
+    nbits = max(ceil(log2(len(palette))), 2)
+    words = np.concatenate([np.empty(0, dtype=np.uint64),
+                            *iter_packed_words((lut[values] for values in grid.iter_yzx()), nbits)])
+    return palette, nbits, words
+
+
+def _encode_regions(grids, threads, scale):
+    """:func:`encode_region` of each grid in order, with at most two per thread encoded ahead of the writer."""
+    if threads == 1 or len(grids) == 1:
+        yield from (encode_region(grid, scale) for grid in grids)
+        return
+    workers = threads or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for grid in grids:
+            pending.append(pool.submit(encode_region, grid, scale))
+            if len(pending) > 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_litematic_regions(regions, nbt, timestamp=None, name=SCHEMATIC_NAME, author=SCHEMATIC_AUTHOR, threads=None,
+                            scale=1, preview=None, source=None):
+    """
+    A Litematica schematic of several regions ``{name: grid}``, each placed at its grid's origin and scaled by
+    ``scale``, with the metadata of ``source`` (the root entries of a loaded .litematic) where given.
+    Regions are encoded by :func:`encode_region` on ``threads`` threads (None for one per CPU)
+    and written in order as they complete, so only a few encoded regions are held at once.
+    """
+    grids = list(regions.values())
+    lo = np.min([grid.origin for grid in grids], axis=0)
+    hi = np.max([np.add(grid.origin, (grid.width, grid.height, grid.length)) for grid in grids], axis=0)
+    cube = scale ** 3
+    with nbt.compound():
+        _write_litematic_header(nbt, ((hi - lo) * scale).tolist(), len(grids),
+                                sum(grid.block_count() for grid in grids) * cube,
+                                sum(grid.volume for grid in grids) * cube, timestamp, name, author, preview,
+                                source)
+        with nbt.compound("Regions"):
+            payloads = _encode_regions(grids, threads, scale)
+            for (region_name, grid), (palette, nbits, words) in zip(regions.items(), payloads):
+                position = (np.subtract(grid.origin, lo) * scale).tolist()
+                size = (grid.width * scale, grid.height * scale, grid.length * scale)
+                _write_litematic_region(nbt, region_name, position, size, palette, nbits, [words])
+
+
+def write_sponge(grid, nbt, timestamp=None):
+    """A Sponge schematic v2, with the palette indices varint-encoded in y, z, x order."""
+    with nbt.compound("Schematic"):
+        nbt.tag("Version", Int(SPONGE_VERSION))
+        nbt.tag("DataVersion", Int(MC_DATA_VERSION))
+        with nbt.compound("Metadata"):
+            nbt.tag("Name", String(SCHEMATIC_NAME))
+            nbt.tag("Author", String(SCHEMATIC_AUTHOR))
+            nbt.tag("Date", Long(round(time() * 1000) if timestamp is None else timestamp))
+        nbt.tag("Width", Short(grid.width))
+        nbt.tag("Height", Short(grid.height))
+        nbt.tag("Length", Short(grid.length))
+        nbt.tag("Offset", IntArray([0, 0, 0]))
+        nbt.tag("PaletteMax", Int(len(grid.palette)))
+        nbt.tag("Palette", Compound({identifier: Int(i) for i, identifier in enumerate(grid.palette)}))
+        size = sum(varint_size(values) for values in grid.iter_yzx())
+        nbt.array("BlockData", ByteArray, size, (encode_varints(v).view(np.int8) for v in grid.iter_yzx()))
+        nbt.tag("BlockEntities", List[Compound]())
+        nbt.tag("Entities", List[Compound]())
+
+
+# Binary layout of one structure block compound {pos: [x, y, z], state: i}
+_BLOCK_RECORD = np.dtype([
+    ("pos_id", "u1"), ("pos_name_length", ">u2"), ("pos_name", "S3"),
+    ("pos_type", "u1"), ("pos_length", ">i4"), ("pos", ">i4", (3,)),
+    ("state_id", "u1"), ("state_name_length", ">u2"), ("state_name", "S5"), ("state", ">i4"),
+    ("end", "u1"),
+])
+
+
+def write_structure(grid, nbt, timestamp=None):
+    """
+    A vanilla structure listing only the non-air blocks, so placing it leaves the surroundings untouched.
+    The block list is serialized from position and state arrays, one x slab at a time.
+    Structures record no time, so ``timestamp`` is unused.
+    """
+    with nbt.compound():
+        nbt.tag("DataVersion", Int(MC_DATA_VERSION))
+        nbt.tag("size", List[Int]([Int(grid.width), Int(grid.height), Int(grid.length)]))
+        nbt.tag("palette", List[Compound]([block_state(i).to_nbt() for i in grid.palette]))
+        nbt.list_header("blocks", Compound, grid.block_count())
+        slab = max(1, PACK_CHUNK // max(1, grid.height * grid.length))
+        for x in range(0, grid.width, slab):
+            blocks = grid.read((x, 0, 0), (min(x + slab, grid.width), grid.height, grid.length))
+            positions = np.argwhere(blocks)
+            records = np.empty(len(positions), dtype=_BLOCK_RECORD)
+            records["pos_id"], records["pos_name_length"], records["pos_name"] = List.tag_id, 3, b"pos"
+            records["pos_type"], records["pos_length"] = Int.tag_id, 3
+            records["pos"] = positions + (x, 0, 0)
+            records["state_id"], records["state_name_length"], records["state_name"] = Int.tag_id, 5, b"state"
+            records["state"] = blocks[tuple(positions.T)]
+            records["end"] = 0
+            nbt.raw(records.tobytes())
+        nbt.tag("entities", List[Compound]())
+
+
+WRITERS = {"litematic": write_litematic, "schem": write_sponge, "nbt": write_structure}
+
+
+def deterministic_timestamp():
+    """
+    The time recorded in deterministic output, in milliseconds:
+    SOURCE_DATE_EPOCH (seconds, the reproducible-builds convention) when set, otherwise 0.
+    """
+    return int(os.environ.get("SOURCE_DATE_EPOCH", 0)) * 1000
+
+
+@contextmanager
+def open_output(path):
+    """``path`` opened for binary writing, removed again if writing fails so no truncated file is left behind."""
+    try:
+        with open(path, "wb") as f:
+            yield f
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def write_grid(grid, fileobj, fmt="litematic", timestamp=None, preview=None):
+    """
+    Streams a :class:`~voxels.VoxelGrid` as uncompressed NBT in one of the NBT formats into a writable binary
+    file object; wrap it in :func:`compression.open_compressed` for the gzipped files Minecraft and the mods expect.
+    Only .litematic files hold a ``preview`` thumbnail.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown NBT export format: {fmt}")
+    if fmt == "litematic":
+        write_litematic(grid, NBTWriter(fileobj), timestamp, preview=preview)
+    else:
+        WRITERS[fmt](grid, NBTWriter(fileobj), timestamp)
+
+
+def save_grid(grid, path, fmt="litematic", compresslevel=DEFAULT_COMPRESSLEVEL, threads=1, deterministic=False,
+              preview=None):
+    """
+    Encodes a :class:`~voxels.VoxelGrid` in one of EXPORT_FORMATS and writes it to ``path``.
+
+    :param compresslevel:   gzip level of the NBT formats, 0 (none) and 1 (fastest) to 9 (smallest)
+    :param threads:         compression threads; 0 uses one per CPU for grids of at least PARALLEL_MIN_VOLUME voxels
+    :param deterministic:   record :func:`deterministic_timestamp` instead of the current time and a zero gzip mtime,
+                            so the same grid and options always give the same bytes
+    :param preview:         ARGB thumbnail pixels of a .litematic, see :func:`preview.preview_image_data`
+    """
+    if threads == 0:
+        threads = None if grid.volume >= PARALLEL_MIN_VOLUME else 1
+    timestamp = deterministic_timestamp() if deterministic else None
+    if fmt == "datapack":
+        write_datapack(grid, path, timestamp=timestamp)
+    elif fmt in WRITERS:
+        mtime = 0 if deterministic else None
+        with open_output(path) as f, open_compressed(f, compresslevel, threads, mtime) as gz:
+            write_grid(grid, gz, fmt, timestamp, preview)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def save_regions(regions, path, compresslevel=DEFAULT_COMPRESSLEVEL, threads=None, deterministic=False,
+                 name=SCHEMATIC_NAME, scale=1, preview=None, author=SCHEMATIC_AUTHOR, source=None):
+    """
+    Writes a multi-region .litematic of ``{name: grid}`` scaled by ``scale`` to ``path``, encoding the regions
+    and compressing on ``threads`` threads (None for one per CPU); ``source`` as in
+    :func:`write_litematic_regions`, other parameters as in :func:`save_grid`.
+    """
+    timestamp = deterministic_timestamp() if deterministic else None
+    volume = sum(grid.volume for grid in regions.values()) * scale ** 3
+    gzip_threads = threads if volume >= PARALLEL_MIN_VOLUME else 1
+    with open_output(path) as f, open_compressed(f, compresslevel, gzip_threads, 0 if deterministic else None) as gz:
+        write_litematic_regions(regions, NBTWriter(gz), timestamp, name, author, threads, scale, preview, source)
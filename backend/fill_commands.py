@@ -0,0 +1,125 @@
+import json
+import time
+import zipfile
+
+import numpy as np
+
+# Most blocks a single /fill may change (vanilla default)
+FILL_LIMIT = 32768
+
+# Commands per function file, to keep the files small. The root function runs every part in the same tick,
+# so the whole statue counts against one maxCommandChainLength (65536 by default); the parts cannot be
+# scheduled instead, since scheduled functions lose the executor's position the statue is built from.
+COMMANDS_PER_FUNCTION = 10000
+
+# pack_format of Minecraft 1.18.2, the data version the other export formats target
+DATAPACK_FORMAT = 9
+DATAPACK_NAMESPACE = "skinstatue"
+FUNCTION_NAME = "statue"
+
+# Statue corner relative to the executing command block or player, so the statue never replaces it
+ORIGIN_OFFSET = (1, 0, 0)
+
+
+def _merge_runs(keys, coord, max_length):
+    """
+    Groups items sharing every key array whose ``coord`` values are consecutive into runs
+    of at most ``max_length`` items (one limit per item).
+
+    :returns: (first, last) item indices of every run
+    """
+    order = np.lexsort([coord] + keys)
+    keys = [k[order] for k in keys]
+    coord, max_length = coord[order], max_length[order]
+    n = len(order)
+    same = coord[1:] == coord[:-1] + 1
+    for k in keys:
+        same &= k[1:] == k[:-1]
+    start = np.concatenate([[True], ~same])
+    group_start = np.maximum.accumulate(np.where(start, np.arange(n), 0))
+    start |= (np.arange(n) - group_start) % max_length == 0
+    firsts = np.nonzero(start)[0]
+    lasts = np.append(firsts[1:] - 1, n - 1)
+    return order[firsts], order[lasts]
+
+
+def merge_boxes(blocks, limit=FILL_LIMIT):
+    """
+    Decomposes the non-air voxels of a [x, y, z] index grid into same-block cuboids of at most ``limit`` blocks,
+    greedily merging runs along x, then identical runs along z, then identical rectangles along y.
+
+    :returns: int array (N, 7) of x0, y0, z0, x1, y1, z1, palette index
+    """
+    rows = blocks.transpose(1, 2, 0)  # [y, z, x]
+    height, length, width = rows.shape
+    flat = rows.reshape(-1, width)
+    change = np.ones(flat.shape, dtype=bool)
+    change[:, 1:] = flat[:, 1:] != flat[:, :-1]
+    row, x0 = np.nonzero(change)
+    x1 = np.where(np.append(row[1:], -1) == row, np.append(x0[1:], width), width) - 1
+    value = flat[row, x0].astype(np.int64)
+    keep = value != 0
+    row, x0, x1, value = row[keep], x0[keep], x1[keep], value[keep]
+
+    # Split runs longer than the limit
+    pieces = (x1 - x0) // limit + 1
+    if pieces.max(initial=1) > 1:
+        item = np.repeat(np.arange(len(row)), pieces)
+        piece = np.arange(len(item)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        row, value = row[item], value[item]
+        x0, x1 = x0[item] + piece * limit, np.minimum(x0[item] + piece * limit + limit - 1, x1[item])
+    y, z = row // length, row % length
+    dx = x1 - x0 + 1
+
+    first, last = _merge_runs([x0, x1, value, y], z, limit // dx)
+    y, x0, x1, value, dx = y[first], x0[first], x1[first], value[first], dx[first]
+    z0, z1 = z[first], z[last]
+    area = dx * (z1 - z0 + 1)
+
+    first, last = _merge_runs([x0, x1, z0, z1, value], y, limit // area)
+    return np.stack([x0[first], y[first], z0[first], x1[first], y[last], z1[first], value[first]], axis=1)
+
+
+def fill_commands(grid, limit=FILL_LIMIT):
+    """``fill`` (or ``setblock`` for single blocks) commands building the grid relative to the executor."""
+    ox, oy, oz = ORIGIN_OFFSET
+    commands = []
+    for x0, y0, z0, x1, y1, z1, index in merge_boxes(grid.blocks, limit).tolist():
+        block = grid.palette[index]
+        if (x0, y0, z0) == (x1, y1, z1):
+            commands.append(f"setblock ~{x0 + ox} ~{y0 + oy} ~{z0 + oz} {block}")
+        else:
+            commands.append(f"fill ~{x0 + ox} ~{y0 + oy} ~{z0 + oz} ~{x1 + ox} ~{y1 + oy} ~{z1 + oz} {block}")
+    return commands
+
+
+def write_datapack(grid, path, limit=FILL_LIMIT, timestamp=None):
+    """
+    Writes a datapack .zip whose ``skinstatue:statue`` function builds the statue next to the executor,
+    split into ``skinstatue:statue/part_N`` functions of at most COMMANDS_PER_FUNCTION commands each.
+    With a ``timestamp`` (milliseconds), every entry gets that modification time instead of the current one.
+
+    :returns: the number of commands
+    """
+    commands = fill_commands(grid, limit)
+    functions = f"data/{DATAPACK_NAMESPACE}/functions/"
+    parts = [commands[i:i + COMMANDS_PER_FUNCTION] for i in range(0, len(commands), COMMANDS_PER_FUNCTION)]
+    # Zip times start in 1980
+    date_time = None if timestamp is None else time.gmtime(max(timestamp // 1000, 315532800))[:6]
+
+    def entry(name):
+        if date_time is None:
+            return name
+        # A ZipInfo entry is written with its own compression, not the archive's
+        info = zipfile.ZipInfo(name, date_time=date_time)
+        info.compress_type = pack.compression
+        return info
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as pack:
+        pack.writestr(entry("pack.mcmeta"), json.dumps(
+            {"pack": {"pack_format": DATAPACK_FORMAT, "description": "Skin statue"}}, indent=2))
+        for i, part in enumerate(parts):
+            pack.writestr(entry(f"{functions}{FUNCTION_NAME}/part_{i}.mcfunction"), "\n".join(part) + "\n")
+        pack.writestr(entry(f"{functions}{FUNCTION_NAME}.mcfunction"), "".join(
+            f"function {DATAPACK_NAMESPACE}:{FUNCTION_NAME}/part_{i}\n" for i in range(len(parts))))
+    return len(commands)
@@ -0,0 +1,158 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import skin_to_litematic
+from batch import load_palette, statue_grids
+from compression import DEFAULT_COMPRESSLEVEL
+from dithering import DITHER_MODES
+from export_formats import save_grid, save_regions
+from palette_profiles import get_palette_profiles
+from preview import preview_image_data, render_preview
+from voxels import AIR, ChunkedGrid, VoxelGrid
+
+# Blocks of air between neighbouring statues
+DEFAULT_SPACING = 2
+
+# Direction the statues' fronts face; a plain conversion faces south (+z)
+GALLERY_FACINGS = ("south", "west", "north", "east")
+
+_HORIZONTAL = ("north", "east", "south", "west")
+
+
+def rotate_identifier(identifier, turns):
+    """The block state seen after turning it ``turns`` quarter turns clockwise (from above)."""
+    block_id, _, state = identifier.partition("[")
+    if not state or turns % 4 == 0:
+        return identifier
+    properties = dict(prop.split("=", 1) for prop in state.rstrip("]").split(","))
+    if properties.get("facing") in _HORIZONTAL:
+        properties["facing"] = _HORIZONTAL[(_HORIZONTAL.index(properties["facing"]) + turns) % 4]
+    if turns % 2 and properties.get("axis") in ("x", "z"):
+        properties["axis"] = "z" if properties["axis"] == "x" else "x"
+    return block_id + "[" + ",".join(f"{k}={v}" for k, v in properties.items()) + "]"
+
+
+def rotate_grid(grid, facing):
+    """The statue turned about the vertical axis so its front faces ``facing``, block states included."""
+    turns = GALLERY_FACINGS.index(facing)
+    blocks = grid.blocks
+    for _ in range(turns):
+        # (x, z) -> (-z, x): a quarter turn clockwise seen from above
+        blocks = np.flip(blocks.transpose(2, 1, 0), axis=0)
+    palette = [rotate_identifier(identifier, turns) for identifier in grid.palette]
+    return VoxelGrid(np.ascontiguousarray(blocks), palette, grid.origin)
+
+
+def layout(grids, columns=None, spacing=DEFAULT_SPACING):
+    """
+    Positions of statues placed in rows of ``columns`` (one row by default) along x, rows stacked along z,
+    each centred in a cell as large as the largest statue plus ``spacing``. Feet stay level.
+
+    :returns: (x, y, z) corner of every grid
+    """
+    columns = columns or len(grids)
+    cell_x = max(grid.width for grid in grids) + spacing
+    cell_z = max(grid.length for grid in grids) + spacing
+    floor = min(grid.origin[1] for grid in grids)
+    positions = []
+    for i, grid in enumerate(grids):
+        row, column = divmod(i, columns)
+        positions.append((column * cell_x + (cell_x - spacing - grid.width) // 2, grid.origin[1] - floor,
+                          row * cell_z + (cell_z - spacing - grid.length) // 2))
+    return positions
+
+
+def region_names(paths):
+    """Unique region names from the skin file names."""
+    names = []
+    for path in paths:
+        base = os.path.splitext(os.path.basename(path))[0] or "Statue"
+        name, n = base, 2
+        while name in names:
+            name, n = f"{base}_{n}", n + 1
+        names.append(name)
+    return names
+
+
+def merge_grids(grids, positions, scale=1):
+    """One sparse grid holding every statue at its position, on the union of their palettes."""
+    palette = [AIR] + sorted({identifier for grid in grids for identifier in grid.palette} - {AIR})
+    index = {identifier: i for i, identifier in enumerate(palette)}
+    shape = np.max([np.add(p, grid.blocks.shape) for grid, p in zip(grids, positions)], axis=0) * scale
+    merged = ChunkedGrid(shape, palette)
+    for grid, position in zip(grids, positions):
+        lut = np.array([index[identifier] for identifier in grid.palette], dtype=merged.dtype)
+        for x in range(grid.width):
+            # Statues never overlap: writing air around them leaves their neighbours untouched
+            layer = np.repeat(np.repeat(lut[grid.blocks[x]], scale, axis=0), scale, axis=1)
+            for dx in range(scale):
+                merged.write(((position[0] + x) * scale + dx, position[1] * scale, position[2] * scale), layer[None])
+    return merged
+
+
+def build_gallery(skin_paths, output_path, columns=None, spacing=DEFAULT_SPACING, facing="south", merge=False,
+                  scale=1, options=None, workers=None, compresslevel=DEFAULT_COMPRESSLEVEL, deterministic=False):
+    """
+    Converts every skin (in parallel, see :func:`batch.statue_grids`) and writes one .litematic
+    with a region per statue, or a single region holding all of them when ``merge`` is set.
+    Statues are kept unscaled until they are written, so hundreds of skins stay small in memory.
+
+    :param options: keyword arguments of :func:`skin_to_litematic.build_statue_data` (dither, profile, ...)
+    """
+    grids = [rotate_grid(grid, facing) for grid in statue_grids(skin_paths, options, workers)]
+    positions = layout(grids, columns, spacing)
+    placed = [VoxelGrid(grid.blocks, grid.palette, position) for grid, position in zip(grids, positions)]
+    load_palette()
+    preview = preview_image_data(render_preview(placed, skin_to_litematic.BLOCK_PALETTE))
+    if merge:
+        save_grid(merge_grids(grids, positions, scale), output_path, "litematic", compresslevel, 0, deterministic,
+                  preview)
+    else:
+        regions = dict(zip(region_names(skin_paths), placed))
+        save_regions(regions, output_path, compresslevel, None, deterministic, scale=scale, preview=preview)
+    print(f"Saved gallery of {len(grids)} statues to {output_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build one Litematica schematic holding a statue per skin.")
+    parser.add_argument("skins", nargs="+", help="skin .png files")
+    parser.add_argument("-o", "--output", default="gallery.litematic", help="output path (default gallery.litematic)")
+    parser.add_argument("--columns", type=int, help="statues per row (default: a single row)")
+    parser.add_argument("--spacing", type=int, default=DEFAULT_SPACING,
+                        help=f"blocks between statues (default {DEFAULT_SPACING})")
+    parser.add_argument("--facing", choices=GALLERY_FACINGS, default="south", help="direction the statues face")
+    parser.add_argument("--merge", action="store_true", help="one region holding every statue")
+    parser.add_argument("--scale", type=int, default=1, help="build every voxel as a SCALE³ cube (default 1)")
+    parser.add_argument("--workers", type=int, help="conversion processes (default: one per CPU)")
+    parser.add_argument("--dither", choices=DITHER_MODES, default="none", help="as in skin_to_litematic.py")
+    parser.add_argument("--max-blocks", type=int, metavar="K", help="as in skin_to_litematic.py")
+    parser.add_argument("--profile", choices=sorted(get_palette_profiles()), help="as in skin_to_litematic.py")
+    parser.add_argument("--facing-aware", action="store_true", help="as in skin_to_litematic.py")
+    parser.add_argument("--deterministic", action="store_true", help="as in skin_to_litematic.py")
+    args = parser.parse_args()
+    if args.columns is not None and args.columns < 1:
+        parser.error("--columns must be at least 1")
+    if args.spacing < 0:
+        parser.error("--spacing must not be negative")
+    if args.scale < 1:
+        parser.error("--scale must be at least 1")
+    if args.max_blocks is not None and args.max_blocks < 1:
+        parser.error("--max-blocks must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    missing = [path for path in args.skins if not os.path.exists(path)]
+    if missing:
+        print(f"Error: skin not found: {', '.join(missing)}")
+        sys.exit(1)
+
+    options = {"dither": args.dither, "max_blocks": args.max_blocks, "profile": args.profile,
+               "facing_aware": args.facing_aware}
+    try:
+        build_gallery(args.skins, args.output, args.columns, args.spacing, args.facing, args.merge, args.scale,
+                      options, args.workers, deterministic=args.deterministic)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
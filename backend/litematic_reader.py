@@ -0,0 +1,134 @@
+import gzip
+from math import ceil, log2
+
+import numpy as np
+
+from nbt_stream import BufferReader, NBTReader
+from voxels import VoxelGrid, index_dtype, unpack_bits
+
+
+def state_identifier(entry):
+    """``minecraft:oak_log[axis=x]`` from a BlockStatePalette entry ``{"Name": ..., "Properties": {...}}``."""
+    properties = entry.get("Properties")
+    if not properties:
+        return entry["Name"]
+    return entry["Name"] + "[" + ",".join(f"{k}={v}" for k, v in properties.items()) + "]"
+
+
+def read_metadata(path):
+    """
+    The root entries of a .litematic other than ``Regions``: version numbers and the ``Metadata`` compound.
+    Decompression stops at the end of Metadata; a ``Regions`` compound stored before it is skipped
+    without being built.
+    """
+    header = {}
+    with gzip.open(path, "rb") as f:
+        reader = NBTReader(f)
+        tag_id, _ = reader.read_header()
+        if tag_id != 10:
+            raise ValueError(f"{path} is not an NBT file with a compound root")
+        for tag_id, name in reader.iter_compound():
+            if name == "Regions":
+                reader.skip_payload(tag_id)
+                continue
+            header[name] = reader.read_payload(tag_id)
+            if name == "Metadata":
+                break
+    return header
+
+
+class LitematicRegion:
+    """
+    One region of a loaded .litematic. ``BlockStates`` stays a numpy view over the decompressed file
+    until :attr:`blocks` is first accessed.
+    """
+
+    def __init__(self, name, nbt):
+        self.name = name
+        self.position = tuple(nbt["Position"][k] for k in "xyz")
+        self.size = tuple(nbt["Size"][k] for k in "xyz")
+        self.palette = [state_identifier(entry) for entry in nbt["BlockStatePalette"]]
+        self.nbt = nbt
+        self._blocks = None
+
+    @property
+    def shape(self):
+        return tuple(abs(s) for s in self.size)
+
+    @property
+    def origin(self):
+        """Minimum corner of the region; a negative size extends it from ``Position`` towards negative."""
+        return tuple(p + s + 1 if s < 0 else p for p, s in zip(self.position, self.size))
+
+    @property
+    def volume(self):
+        width, height, length = self.shape
+        return width * height * length
+
+    @property
+    def blocks(self):
+        """Palette indices indexed [x, y, z], unpacked on first access."""
+        if self._blocks is None:
+            width, height, length = self.shape
+            nbits = max(ceil(log2(max(len(self.palette), 1))), 2)
+            values = unpack_bits(self.nbt["BlockStates"], self.volume, nbits)
+            dtype = index_dtype(len(self.palette))
+            self._blocks = np.ascontiguousarray(values.astype(dtype).reshape(height, length, width).transpose(2, 0, 1))
+        return self._blocks
+
+    def grid(self):
+        return VoxelGrid(self.blocks, self.palette, self.origin)
+
+
+class Litematic:
+    """
+    A .litematic read lazily: :attr:`metadata` only decompresses the file up to the Metadata compound,
+    :attr:`regions` loads the whole file once and each region unpacks its blocks on first use.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._header = None
+        self._regions = None
+
+    @classmethod
+    def load(cls, path):
+        return cls(path)
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._header = read_metadata(self.path)
+        return self._header
+
+    @property
+    def metadata(self):
+        return self.header["Metadata"]
+
+    @property
+    def name(self):
+        return self.metadata.get("Name", "")
+
+    @property
+    def author(self):
+        return self.metadata.get("Author", "")
+
+    @property
+    def enclosing_size(self):
+        size = self.metadata.get("EnclosingSize", {})
+        return tuple(size.get(k, 0) for k in "xyz")
+
+    @property
+    def total_blocks(self):
+        return self.metadata.get("TotalBlocks", 0)
+
+    @property
+    def regions(self):
+        """``{name: LitematicRegion}``, parsed from the fully decompressed file on first access."""
+        if self._regions is None:
+            with gzip.open(self.path, "rb") as f:
+                data = f.read()
+            _, root = NBTReader(BufferReader(data)).read_root()
+            self._header = {name: value for name, value in root.items() if name != "Regions"}
+            self._regions = {name: LitematicRegion(name, nbt) for name, nbt in root["Regions"].items()}
+        return self._regions
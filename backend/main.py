@@ -1,12 +1,41 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import shutil
+from fastapi.concurrency import run_in_threadpool
+import gzip
+import hashlib
+import io
+import logging
 import os
 import uuid
-from skin_to_litematic import load_skin, build_statue_data, generate_litematic, get_block_palette, BLOCK_PALETTE
+from collections import OrderedDict
+from typing import List, Optional
+from PIL import Image, UnidentifiedImageError
+from skin_to_litematic import load_skin, build_statue_data, export_statue, get_block_palette, get_block_faces, BLOCK_PALETTE, BLOCK_FACES
+from dithering import DITHER_MODES
+from palette_profiles import get_palette_profiles
+from export_formats import EXPORT_FORMATS
+from compression import DEFAULT_COMPRESSLEVEL
+from gallery import DEFAULT_SPACING, GALLERY_FACINGS, build_gallery
+from preview import statue_glb
+from voxels import VoxelGrid
 
 app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Largest statue scale served by the API
+MAX_SCALE = 16
+
+# Most blocks a skin may be reduced to; the palette reduction grows with it
+MAX_BLOCKS = 64
+
+# Most skins in one /gallery request, and the count from which they are converted on a process pool
+MAX_GALLERY_SKINS = 512
+PARALLEL_GALLERY_SKINS = 16
+
+# Previews kept in memory, keyed by the hash of the skin and the options
+PREVIEW_CACHE_SIZE = 256
+_previews = OrderedDict()
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -17,6 +46,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def check_image(data, filename):
+    """
+    Rejects uploads that PIL cannot read as an image with a 400, before any conversion starts.
+    Error details only name the upload, never server-side paths; the cause is logged.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        logger.info("Rejected upload %s: %s", filename, e)
+        raise HTTPException(status_code=400, detail=f"{filename} is not a readable PNG image.")
+
+def conversion_failed(e):
+    """A 500 with a fixed detail for an unexpected conversion error, which is logged with its traceback."""
+    logger.error("Conversion failed", exc_info=e)
+    return HTTPException(status_code=500, detail="Conversion failed.")
+
 # Initialize palette on startup
 @app.on_event("startup")
 async def startup_event():
@@ -25,6 +71,7 @@ async def startup_event():
         # Ensure we are in the backend directory or can find the json
         if os.path.exists("block_palette.json"):
             BLOCK_PALETTE.update(get_block_palette())
+            BLOCK_FACES.update(get_block_faces())
             print(f"Loaded {len(BLOCK_PALETTE)} blocks into palette.")
         else:
             print("Warning: block_palette.json not found. Run fetch_palette.py first.")
@@ -32,9 +79,22 @@ async def startup_event():
         print(f"Error loading palette: {e}")
 
 @app.post("/convert")
-async def convert_skin(file: UploadFile = File(...)):
+async def convert_skin(request: Request, file: UploadFile = File(...), dither: str = Query("none"),
+                       max_blocks: Optional[int] = Query(None, ge=1, le=MAX_BLOCKS),
+                       profile: Optional[str] = Query(None), facing_aware: bool = Query(False),
+                       shading: float = Query(1.0, ge=0.0, le=1.0),
+                       noise_weight: float = Query(0.0, ge=0.0), fmt: str = Query("litematic", alias="format"),
+                       scale: int = Query(1, ge=1, le=MAX_SCALE),
+                       compression_level: int = Query(DEFAULT_COMPRESSLEVEL, ge=0, le=9),
+                       deterministic: bool = Query(False)):
     if not file.filename.endswith(".png"):
         raise HTTPException(status_code=400, detail="File must be a PNG image.")
+    if dither not in DITHER_MODES:
+        raise HTTPException(status_code=400, detail=f"dither must be one of: {', '.join(DITHER_MODES)}")
+    if profile is not None and profile not in get_palette_profiles():
+        raise HTTPException(status_code=400, detail=f"Unknown palette profile: {profile}")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
     
     # Create temp directory for processing
     temp_dir = f"temp_{uuid.uuid4()}"
@@ -42,19 +102,26 @@ async def convert_skin(file: UploadFile = File(...)):
     
     try:
         input_path = os.path.join(temp_dir, file.filename)
-        output_filename = file.filename.replace(".png", ".litematic")
+        output_filename = file.filename.replace(".png", EXPORT_FORMATS[fmt])
         output_path = os.path.join(temp_dir, output_filename)
         
         # Save uploaded file
+        data = await file.read()
+        check_image(data, file.filename)
         with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            buffer.write(data)
             
         # Process
-        img = load_skin(input_path)
+        try:
+            img = load_skin(input_path)
+        except ValueError as e:
+            logger.info("Rejected upload %s: %s", file.filename, e)
+            raise HTTPException(status_code=400, detail=f"{file.filename} is not a readable PNG image.")
         
         # Ensure palette is loaded if not already (redundant check)
         if not BLOCK_PALETTE:
              BLOCK_PALETTE.update(get_block_palette())
+             BLOCK_FACES.update(get_block_faces())
 
         # We need to inject the palette into the module or pass it if modified
         # skin_to_litematic.py uses a global BLOCK_PALETTE. 
@@ -64,13 +131,25 @@ async def convert_skin(file: UploadFile = File(...)):
         import skin_to_litematic
         skin_to_litematic.BLOCK_PALETTE = BLOCK_PALETTE
         
-        data = build_statue_data(img)
-        generate_litematic(data, output_path)
-        
-        return FileResponse(output_path, filename=output_filename, media_type="application/octet-stream")
-        
+        # Conversion is CPU-bound, so it runs in a worker thread to keep serving other requests
+        def convert():
+            data = build_statue_data(img, dither=dither, max_blocks=max_blocks, profile=profile,
+                                     facing_aware=facing_aware, shading=shading, noise_weight=noise_weight)
+            export_statue(data, output_path, fmt, scale, compression_level, threads=0, deterministic=deterministic)
+        await run_in_threadpool(convert)
+
+        # Content hash, so deterministic conversions of the same skin and options share an ETag
+        with open(output_path, "rb") as f:
+            etag = f'"{hashlib.file_digest(f, "sha256").hexdigest()}"'
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers={"ETag": etag})
+        return FileResponse(output_path, filename=output_filename, media_type="application/octet-stream",
+                            headers={"ETag": etag})
+
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise conversion_failed(e)
         
     finally:
         # Cleanup is tricky with FileResponse as it needs the file open.
@@ -80,6 +159,105 @@ async def convert_skin(file: UploadFile = File(...)):
         # Let's just leave it for this prototype or use a background task.
         pass
 
+@app.post("/gallery")
+async def convert_gallery(files: List[UploadFile] = File(...), columns: Optional[int] = Query(None, ge=1),
+                          spacing: int = Query(DEFAULT_SPACING, ge=0), facing: str = Query("south"),
+                          merge: bool = Query(False), scale: int = Query(1, ge=1, le=MAX_SCALE),
+                          dither: str = Query("none"), max_blocks: Optional[int] = Query(None, ge=1, le=MAX_BLOCKS),
+                          profile: Optional[str] = Query(None), facing_aware: bool = Query(False),
+                          deterministic: bool = Query(False)):
+    if len(files) > MAX_GALLERY_SKINS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_GALLERY_SKINS} skins per gallery.")
+    if any(not f.filename.endswith(".png") for f in files):
+        raise HTTPException(status_code=400, detail="Files must be PNG images.")
+    if facing not in GALLERY_FACINGS:
+        raise HTTPException(status_code=400, detail=f"facing must be one of: {', '.join(GALLERY_FACINGS)}")
+    if dither not in DITHER_MODES:
+        raise HTTPException(status_code=400, detail=f"dither must be one of: {', '.join(DITHER_MODES)}")
+    if profile is not None and profile not in get_palette_profiles():
+        raise HTTPException(status_code=400, detail=f"Unknown palette profile: {profile}")
+
+    temp_dir = f"temp_{uuid.uuid4()}"
+    os.makedirs(temp_dir, exist_ok=True)
+    try:
+        paths = []
+        for i, file in enumerate(files):
+            # One directory per upload, so skins with the same name keep their own region
+            os.makedirs(os.path.join(temp_dir, str(i)))
+            paths.append(os.path.join(temp_dir, str(i), os.path.basename(file.filename)))
+            data = await file.read()
+            # A bad skin would otherwise fail in a conversion worker, after all the others were converted
+            check_image(data, file.filename)
+            with open(paths[-1], "wb") as buffer:
+                buffer.write(data)
+
+        output_path = os.path.join(temp_dir, "gallery.litematic")
+        options = {"dither": dither, "max_blocks": max_blocks, "profile": profile, "facing_aware": facing_aware}
+        workers = None if len(paths) >= PARALLEL_GALLERY_SKINS else 1
+        await run_in_threadpool(build_gallery, paths, output_path, columns, spacing, facing, merge, scale, options,
+                                workers, deterministic=deterministic)
+        return FileResponse(output_path, filename="gallery.litematic", media_type="application/octet-stream")
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise conversion_failed(e)
+
+@app.post("/preview")
+async def preview_statue(request: Request, file: UploadFile = File(...), dither: str = Query("none"),
+                         max_blocks: Optional[int] = Query(None, ge=1, le=MAX_BLOCKS),
+                         profile: Optional[str] = Query(None), facing_aware: bool = Query(False),
+                       shading: float = Query(1.0, ge=0.0, le=1.0),
+                         noise_weight: float = Query(0.0, ge=0.0), scale: int = Query(1, ge=1, le=MAX_SCALE)):
+    """
+    The block statue as a greedy-meshed binary glTF (see preview.statue_glb), for rendering in the browser.
+    Scale only changes the node transform, so the payload does not grow with it.
+    """
+    if not file.filename.endswith(".png"):
+        raise HTTPException(status_code=400, detail="File must be a PNG image.")
+    if dither not in DITHER_MODES:
+        raise HTTPException(status_code=400, detail=f"dither must be one of: {', '.join(DITHER_MODES)}")
+    if profile is not None and profile not in get_palette_profiles():
+        raise HTTPException(status_code=400, detail=f"Unknown palette profile: {profile}")
+
+    data = await file.read()
+    options = {"dither": dither, "max_blocks": max_blocks, "profile": profile, "facing_aware": facing_aware,
+               "shading": shading, "noise_weight": noise_weight}
+    digest = hashlib.sha256(data)
+    digest.update(repr((sorted(options.items()), scale)).encode("utf-8"))
+    etag = f'"{digest.hexdigest()}"'
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    entry = _previews.get(etag)
+    if entry is None:
+        check_image(data, file.filename)
+        if not BLOCK_PALETTE:
+            BLOCK_PALETTE.update(get_block_palette())
+            BLOCK_FACES.update(get_block_faces())
+        def render():
+            grid = VoxelGrid.from_statue_blocks(build_statue_data(load_skin(io.BytesIO(data)), **options))
+            return statue_glb(grid, BLOCK_PALETTE, scale)
+        try:
+            glb = await run_in_threadpool(render)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise conversion_failed(e)
+        entry = glb, gzip.compress(glb, 6)
+        _previews[etag] = entry
+        if len(_previews) > PREVIEW_CACHE_SIZE:
+            _previews.popitem(last=False)
+    else:
+        _previews.move_to_end(etag)
+
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(entry[1], media_type="model/gltf-binary", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(entry[0], media_type="model/gltf-binary", headers=headers)
+
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
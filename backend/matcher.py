@@ -0,0 +1,166 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+# Texels with alpha below this value are treated as transparent (air)
+ALPHA_THRESHOLD = 128
+FALLBACK_BLOCK = "minecraft:stone"
+
+# Upper bound on the size of the (colors x palette) distance matrix built at once
+MAX_DISTANCE_CELLS = 1 << 20
+
+# Number of shared matchers (each with its LUT) kept in memory
+MATCHER_CACHE_SIZE = 32
+
+# Step float matching options (noise weight, shading) are rounded to, so near-equal requests share matchers
+OPTION_STEP = 0.01
+
+
+def pack_rgb(rgb):
+    """Packs uint8 RGB triples (..., 3) into uint32 keys (..., )."""
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def unpack_rgb(keys):
+    keys = np.asarray(keys, dtype=np.uint32)
+    return np.stack([(keys >> 16) & 0xFF, (keys >> 8) & 0xFF, keys & 0xFF], axis=-1).astype(np.uint8)
+
+
+class BlockMatcher:
+    """
+    Vectorized nearest-color lookup against a block palette.
+
+    Results for integer colors are memoized in a sorted key/value table (the LUT),
+    so repeated conversions only pay for colors they have not seen before.
+    The matching cost is the squared color distance plus an optional fixed penalty per entry
+    (e.g. for noisy textures).
+    """
+
+    def __init__(self, colors, block_ids, penalties=None):
+        self.colors = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+        self.block_ids = list(block_ids)
+        if len(self.block_ids) != len(self.colors):
+            raise ValueError("colors and block_ids must have the same length")
+        if penalties is None:
+            self.penalties = None
+        else:
+            self.penalties = np.asarray(penalties, dtype=np.float32).reshape(-1)
+            if len(self.penalties) != len(self.colors):
+                raise ValueError("penalties and colors must have the same length")
+        digest = hashlib.sha1(self.colors.tobytes())
+        if self.penalties is not None:
+            digest.update(self.penalties.tobytes())
+        digest.update("\n".join(self.block_ids).encode("utf-8"))
+        self.key = digest.hexdigest()
+        # Sorted keys and their values, replaced together so lookups from several threads stay consistent
+        self._lut = (np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32))
+        self._spacing = None
+
+    @classmethod
+    def from_palette(cls, palette, penalties=None):
+        """Builds a matcher from a ``{(r, g, b): block_id}`` palette and optional per-entry penalties."""
+        if not palette:
+            return cls([(125, 125, 125)], [FALLBACK_BLOCK])
+        return cls(list(palette.keys()), list(palette.values()), penalties)
+
+    def __len__(self):
+        return len(self.block_ids)
+
+    def subset(self, indices):
+        """A new matcher restricted to the given palette indices, in that order."""
+        indices = np.asarray(indices, dtype=np.intp)
+        penalties = None if self.penalties is None else self.penalties[indices]
+        return BlockMatcher(self.colors[indices], [self.block_ids[i] for i in indices], penalties)
+
+    def distances(self, rgb):
+        """Squared distances (N, palette size) from each color in ``rgb`` (N, 3) to every palette entry."""
+        diff = np.asarray(rgb, dtype=np.float32)[:, None, :] - self.colors[None, :, :]
+        return np.einsum("ijk,ijk->ij", diff, diff)
+
+    def costs(self, rgb):
+        """Matching costs (N, palette size): squared distances plus the per-entry penalties."""
+        costs = self.distances(rgb)
+        if self.penalties is not None:
+            costs += self.penalties[None, :]
+        return costs
+
+    def nearest(self, rgb):
+        """
+        Exact lowest-cost palette index for every color in ``rgb`` (..., 3), which may be fractional.
+        Ties go to the earliest palette entry.
+        """
+        rgb = np.asarray(rgb, dtype=np.float32)
+        flat = rgb.reshape(-1, 3)
+        out = np.empty(len(flat), dtype=np.int32)
+        step = max(1, MAX_DISTANCE_CELLS // max(1, len(self.colors)))
+        for start in range(0, len(flat), step):
+            out[start:start + step] = self.costs(flat[start:start + step]).argmin(axis=1)
+        return out.reshape(rgb.shape[:-1])
+
+    def match(self, rgb):
+        """Nearest palette index for uint8 colors (..., 3), served from the LUT where possible."""
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        keys = pack_rgb(rgb).ravel()
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        return self._lookup(unique_keys)[inverse].reshape(rgb.shape[:-1])
+
+    def _lookup(self, unique_keys):
+        lut_keys, lut_values = self._lut
+        pos = np.searchsorted(lut_keys, unique_keys)
+        pos_clipped = np.minimum(pos, max(len(lut_keys) - 1, 0))
+        if len(lut_keys):
+            hit = lut_keys[pos_clipped] == unique_keys
+        else:
+            hit = np.zeros(len(unique_keys), dtype=bool)
+        values = np.empty(len(unique_keys), dtype=np.int32)
+        values[hit] = lut_values[pos_clipped[hit]]
+        if not hit.all():
+            missing = unique_keys[~hit]
+            found = self.nearest(unpack_rgb(missing))
+            values[~hit] = found
+            keys = np.concatenate([lut_keys, missing])
+            order = np.argsort(keys, kind="stable")
+            self._lut = keys[order], np.concatenate([lut_values, found])[order]
+        return values
+
+    def spacing(self):
+        """Median distance between a palette color and its nearest neighbour in the palette."""
+        if self._spacing is None:
+            if len(self.colors) < 2:
+                self._spacing = 32.0
+            else:
+                diff = self.colors[:, None, :] - self.colors[None, :, :]
+                dist = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+                np.fill_diagonal(dist, np.inf)
+                self._spacing = float(np.median(dist.min(axis=1)))
+        return self._spacing
+
+
+def quantize(value, step=OPTION_STEP):
+    """``value`` rounded to a multiple of ``step``."""
+    return round(round(value / step) * step, 6)
+
+
+_MATCHERS = OrderedDict()
+
+
+def get_matcher(palette, penalties=None):
+    """
+    Returns the shared matcher for a ``{(r, g, b): block_id}`` palette, building it on first use.
+    Each distinct penalty setting gets its own matcher and LUT; the MATCHER_CACHE_SIZE most recently
+    used are kept.
+
+    :param penalties: optional tuple of per-entry cost penalties, in palette order
+    """
+    fingerprint = (tuple(palette.items()), penalties)
+    matcher = _MATCHERS.get(fingerprint)
+    if matcher is None:
+        matcher = BlockMatcher.from_palette(palette, penalties)
+        _MATCHERS[fingerprint] = matcher
+        if len(_MATCHERS) > MATCHER_CACHE_SIZE:
+            _MATCHERS.popitem(last=False)
+    else:
+        _MATCHERS.move_to_end(fingerprint)
+    return matcher
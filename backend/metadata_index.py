@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+import zlib
+
+from litematic_reader import read_metadata
+
+# Cache written inside the indexed directory
+INDEX_FILE = ".litematic_index.json"
+
+
+def metadata_entry(path):
+    """The fields a schematic browser lists, read from the file's Metadata compound only."""
+    header = read_metadata(path)
+    meta = header.get("Metadata", {})
+    size = meta.get("EnclosingSize", {})
+    return {
+        "name": meta.get("Name", ""),
+        "author": meta.get("Author", ""),
+        "description": meta.get("Description", ""),
+        "size": [size.get(k, 0) for k in "xyz"],
+        "total_blocks": meta.get("TotalBlocks", 0),
+        "total_volume": meta.get("TotalVolume", 0),
+        "region_count": meta.get("RegionCount", 0),
+        "time_created": meta.get("TimeCreated", 0),
+        "time_modified": meta.get("TimeModified", 0),
+        "minecraft_data_version": header.get("MinecraftDataVersion", 0),
+    }
+
+
+def _load_index(index_path):
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def build_index(directory, cache=True):
+    """
+    Metadata of every .litematic under ``directory``, keyed by path relative to it.
+    Entries are cached in INDEX_FILE and only re-read for files whose mtime or size changed;
+    files that cannot be read are listed with an "error" instead.
+    """
+    index_path = os.path.join(directory, INDEX_FILE)
+    cached = _load_index(index_path) if cache else {}
+    index = {}
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            if not filename.endswith(".litematic"):
+                continue
+            path = os.path.join(root, filename)
+            key = os.path.relpath(path, directory)
+            stat = os.stat(path)
+            entry = cached.get(key)
+            if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["bytes"] != stat.st_size:
+                try:
+                    entry = metadata_entry(path)
+                except (OSError, EOFError, ValueError, KeyError, zlib.error) as e:
+                    entry = {"error": str(e)}
+                entry.update(mtime_ns=stat.st_mtime_ns, bytes=stat.st_size)
+            index[key] = entry
+    if cache and index != cached:
+        with open(index_path, 'w') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the metadata of every .litematic in a directory.")
+    parser.add_argument("directory")
+    parser.add_argument("--no-cache", action="store_true", help=f"neither read nor write {INDEX_FILE}")
+    parser.add_argument("--json", action="store_true", help="print the index as JSON")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: {args.directory} is not a directory.")
+        sys.exit(1)
+
+    index = build_index(args.directory, cache=not args.no_cache)
+    if args.json:
+        print(json.dumps(index, indent=1, sort_keys=True))
+    else:
+        for key, entry in sorted(index.items()):
+            if "error" in entry:
+                print(f"{key}: unreadable ({entry['error']})")
+            else:
+                print("{}: {} by {}, {}x{}x{}, {} blocks".format(
+                    key, entry["name"], entry["author"], *entry["size"], entry["total_blocks"]))
@@ -0,0 +1,182 @@
+import io
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+from nbtlib.tag import ByteArray, Compound, IntArray, List, LongArray, String
+
+_ARRAY_DTYPES = {ByteArray: ">i1", IntArray: ">i4", LongArray: ">i8"}
+
+# Payload formats of the fixed-size tags, by tag id
+_NUMERIC = {1: struct.Struct(">b"), 2: struct.Struct(">h"), 3: struct.Struct(">i"), 4: struct.Struct(">q"),
+            5: struct.Struct(">f"), 6: struct.Struct(">d")}
+_ARRAYS = {ByteArray.tag_id: np.dtype(">i1"), IntArray.tag_id: np.dtype(">i4"), LongArray.tag_id: np.dtype(">i8")}
+_INT = _NUMERIC[3]
+
+
+class NBTWriter:
+    """
+    Writes big-endian NBT to any writable binary file object (a gzip stream, a socket, an HTTP response body)
+    one tag at a time, so large arrays go from numpy buffers to the stream without building a tag tree.
+
+    Usage::
+
+        with NBTWriter(f).compound() as nbt:    # root compound
+            nbt.tag("Version", Int(6))
+            with nbt.compound("Metadata"):
+                ...
+            nbt.array("BlockStates", LongArray, length, chunks)
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def _header(self, tag_id, name):
+        data = name.encode("utf-8")
+        self.fileobj.write(struct.pack(">BH", tag_id, len(data)) + data)
+
+    def tag(self, name, tag):
+        """Writes a complete (small) nbtlib tag."""
+        self._header(tag.tag_id, name)
+        tag.write(self.fileobj)
+
+    @contextmanager
+    def compound(self, name=""):
+        """Opens a compound; tags written inside the ``with`` block belong to it."""
+        self._header(Compound.tag_id, name)
+        yield self
+        self.fileobj.write(b"\x00")
+
+    def list_header(self, name, item_type, length):
+        """Starts a list of ``length`` items of the given tag class; the caller then writes the bare payloads."""
+        self._header(List.tag_id, name)
+        self.fileobj.write(struct.pack(">Bi", item_type.tag_id if length else 0, length))
+
+    def raw(self, data):
+        """Writes already serialized payload bytes."""
+        self.fileobj.write(data)
+
+    def array(self, name, array_type, length, chunks):
+        """
+        Writes a ByteArray, IntArray or LongArray of ``length`` items from an iterable of numpy chunks,
+        converting each chunk to big-endian on its own.
+        """
+        dtype = _ARRAY_DTYPES[array_type]
+        self._header(array_type.tag_id, name)
+        self.fileobj.write(struct.pack(">i", length))
+        written = 0
+        for chunk in chunks:
+            chunk = np.asarray(chunk).astype(dtype, copy=False)
+            written += len(chunk)
+            self.fileobj.write(chunk.tobytes())
+        if written != length:
+            raise ValueError(f"{name}: expected {length} items, got {written}")
+
+
+class BufferReader:
+    """A read-only file object over a bytes-like buffer whose reads are memoryview slices, not copies."""
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.offset = 0
+
+    def read(self, size):
+        chunk = self.view[self.offset:self.offset + size]
+        self.offset += len(chunk)
+        return chunk
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.offset = offset if whence == io.SEEK_SET else self.offset + offset
+        return self.offset
+
+
+class NBTReader:
+    """
+    Reads big-endian NBT from a binary file object into plain values: dicts for compounds, lists for lists,
+    ints, floats and strings, and numpy arrays for ByteArray, IntArray and LongArray.
+    Arrays are ``np.frombuffer`` views over the bytes read, so with a :class:`BufferReader` a LongArray
+    stays a view over the decompressed buffer and is never turned into Python ints.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+
+    def _read(self, size):
+        data = self.fileobj.read(size)
+        if len(data) != size:
+            raise EOFError("Truncated NBT data")
+        return data
+
+    def read_string(self):
+        length = struct.unpack(">H", self._read(2))[0]
+        return bytes(self._read(length)).decode("utf-8", "replace")
+
+    def read_header(self):
+        """The (tag id, name) of the next named tag; (0, None) at the end of a compound."""
+        tag_id = self._read(1)[0]
+        return (tag_id, None) if tag_id == 0 else (tag_id, self.read_string())
+
+    def iter_compound(self):
+        """
+        Yields (tag id, name) for each entry of the compound being read.
+        The caller must read (or skip) each entry's payload before asking for the next one.
+        """
+        while True:
+            tag_id, name = self.read_header()
+            if tag_id == 0:
+                return
+            yield tag_id, name
+
+    def read_payload(self, tag_id):
+        if tag_id in _NUMERIC:
+            fmt = _NUMERIC[tag_id]
+            return fmt.unpack(self._read(fmt.size))[0]
+        if tag_id in _ARRAYS:
+            dtype = _ARRAYS[tag_id]
+            length = _INT.unpack(self._read(4))[0]
+            return np.frombuffer(self._read(length * dtype.itemsize), dtype=dtype)
+        if tag_id == String.tag_id:
+            return self.read_string()
+        if tag_id == List.tag_id:
+            item_type = self._read(1)[0]
+            length = _INT.unpack(self._read(4))[0]
+            return [self.read_payload(item_type) for _ in range(length)]
+        if tag_id == Compound.tag_id:
+            return {name: self.read_payload(item_type) for item_type, name in self.iter_compound()}
+        raise ValueError(f"Unknown NBT tag id {tag_id}")
+
+    def _skip(self, size):
+        if size:
+            self.fileobj.seek(size, io.SEEK_CUR)
+
+    def skip_payload(self, tag_id):
+        """
+        Moves past a payload without building it: fixed-size tags, strings and arrays are skipped by length,
+        lists and compounds entry by entry.
+        """
+        if tag_id in _NUMERIC:
+            self._skip(_NUMERIC[tag_id].size)
+        elif tag_id in _ARRAYS:
+            self._skip(_INT.unpack(self._read(4))[0] * _ARRAYS[tag_id].itemsize)
+        elif tag_id == String.tag_id:
+            self._skip(struct.unpack(">H", self._read(2))[0])
+        elif tag_id == List.tag_id:
+            item_type = self._read(1)[0]
+            length = _INT.unpack(self._read(4))[0]
+            if item_type in _NUMERIC:
+                self._skip(length * _NUMERIC[item_type].size)
+            else:
+                for _ in range(length):
+                    self.skip_payload(item_type)
+        elif tag_id == Compound.tag_id:
+            for item_type, _ in self.iter_compound():
+                self.skip_payload(item_type)
+        else:
+            raise ValueError(f"Unknown NBT tag id {tag_id}")
+
+    def read_root(self):
+        """The (name, value) of the root compound."""
+        tag_id, name = self.read_header()
+        if tag_id != Compound.tag_id:
+            raise ValueError("NBT root is not a compound")
+        return name, self.read_payload(tag_id)
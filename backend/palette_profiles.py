@@ -0,0 +1,85 @@
+import json
+import os
+from collections import OrderedDict
+
+# Optional file with server-specific profiles, same shape as PALETTE_PROFILES
+PROFILES_FILE = "palette_profiles.json"
+
+# Named subsets of the compiled palette.
+# "include" keeps only blocks matching at least one rule (all blocks if omitted),
+# "exclude" then drops blocks matching any rule.
+# A rule containing ":" must equal the block id, any other rule is a substring of it
+# (the same keyword matching as fetch_palette.EXCLUDED_KEYWORDS).
+PALETTE_PROFILES = {
+    "full": {},
+    "wool": {"include": ["_wool"]},
+    "concrete": {"include": ["_concrete"], "exclude": ["powder"]},
+    "terracotta": {"include": ["terracotta"], "exclude": ["glazed"]},
+    "dyed": {"include": ["_wool", "_concrete", "terracotta"], "exclude": ["powder", "glazed"]},
+    "easy": {
+        "include": ["_wool", "_concrete", "terracotta", "_planks", "_log", "_wood", "stone", "bricks",
+                    "sandstone", "dirt", "clay", "quartz_block"],
+        "exclude": ["powder", "glazed", "ore", "infested", "gilded", "stripped", "reinforced", "end_stone",
+                    "blackstone"],
+    },
+    "survival": {
+        "exclude": ["ore", "diamond", "emerald", "netherite", "ancient_debris", "gold_block", "iron_block",
+                    "lapis_block", "infested", "reinforced", "budding", "bedrock", "sponge", "spawner",
+                    "crying_obsidian", "minecraft:obsidian", "gilded", "suspicious", "trial"],
+    },
+}
+
+# Number of (profile, palette) subsets kept in memory
+PROFILE_CACHE_SIZE = 32
+
+_profiles = None
+_profile_palettes = OrderedDict()
+
+
+def get_palette_profiles():
+    """Built-in profiles merged with the ones from PROFILES_FILE, if present."""
+    global _profiles
+    if _profiles is None:
+        profiles = dict(PALETTE_PROFILES)
+        if os.path.exists(PROFILES_FILE):
+            with open(PROFILES_FILE, 'r') as f:
+                profiles.update(json.load(f))
+        _profiles = profiles
+    return _profiles
+
+
+def _matches(block_id, rule):
+    if ":" in rule:
+        return block_id == rule
+    return rule in block_id
+
+
+def profile_accepts(block_id, profile):
+    include = profile.get("include")
+    if include and not any(_matches(block_id, rule) for rule in include):
+        return False
+    return not any(_matches(block_id, rule) for rule in profile.get("exclude", ()))
+
+
+def get_profile_palette(palette, name):
+    """
+    The subset of a ``{(r, g, b): block_id}`` palette allowed by a named profile, built once per palette;
+    the PROFILE_CACHE_SIZE most recently used subsets are kept.
+
+    :raises ValueError: if the profile is unknown or keeps no block of the palette
+    """
+    profiles = get_palette_profiles()
+    if name not in profiles:
+        raise ValueError(f"Unknown palette profile: {name}")
+    key = (name, tuple(palette.items()))
+    subset = _profile_palettes.get(key)
+    if subset is None:
+        subset = {color: block_id for color, block_id in palette.items() if profile_accepts(block_id, profiles[name])}
+        if not subset:
+            raise ValueError(f"Palette profile '{name}' does not allow any block of the palette")
+        _profile_palettes[key] = subset
+        if len(_profile_palettes) > PROFILE_CACHE_SIZE:
+            _profile_palettes.popitem(last=False)
+    else:
+        _profile_palettes.move_to_end(key)
+    return subset
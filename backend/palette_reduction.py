@@ -0,0 +1,98 @@
+import numpy as np
+
+from matcher import ALPHA_THRESHOLD
+
+# Upper bound on PAM swap passes; each pass applies the single best swap
+MAX_SWAP_PASSES = 50
+
+# Palette entries nearest to a medoid that may replace it in a swap, so a pass costs k * colors * this
+# rather than k * colors * palette size
+SWAP_CANDIDATES = 16
+
+
+def used_colors(rgba, rects):
+    """
+    Unique opaque colors inside the given face rectangles, with how many texels use each.
+
+    :returns: (colors (U, 3) uint8, counts (U,) int64)
+    """
+    pixels = np.concatenate([rgba[v:v + h, u:u + w].reshape(-1, 4) for u, v, w, h in rects])
+    pixels = pixels[pixels[:, 3] >= ALPHA_THRESHOLD, :3]
+    if len(pixels) == 0:
+        return np.empty((0, 3), dtype=np.uint8), np.empty(0, dtype=np.int64)
+    colors, counts = np.unique(pixels, axis=0, return_counts=True)
+    return colors, counts
+
+
+def _assignment_costs(dist, medoids):
+    """Nearest and second-nearest distances of every color to the chosen medoids."""
+    sub = dist[:, medoids]
+    if len(medoids) == 1:
+        return sub[:, 0], np.zeros(len(dist), dtype=np.intp), np.full(len(dist), np.inf, dtype=sub.dtype)
+    order = np.argpartition(sub, 1, axis=1)
+    rows = np.arange(len(dist))
+    return sub[rows, order[:, 0]], order[:, 0], sub[rows, order[:, 1]]
+
+
+def swap_candidates(matcher, n=SWAP_CANDIDATES):
+    """The ``n`` palette entries nearest to each entry (itself first), (palette size, n)."""
+    n = min(n, len(matcher))
+    dist = matcher.distances(matcher.colors)
+    return np.argsort(dist, axis=1, kind="stable")[:, :n]
+
+
+def choose_blocks(colors, counts, matcher, k):
+    """
+    Chooses at most ``k`` palette entries minimizing the total matching cost of the used colors,
+    using weighted k-medoids (greedy BUILD followed by PAM swaps) with medoids drawn from the palette.
+    A swap only considers the :data:`SWAP_CANDIDATES` entries nearest to the medoid it replaces.
+
+    :param colors:  unique colors (U, 3)
+    :param counts:  number of texels per color (U,)
+    :returns:       sorted palette indices of the chosen blocks
+    """
+    if len(colors) == 0:
+        return np.zeros(1, dtype=np.intp)
+    dist = matcher.costs(colors)
+    weights = np.asarray(counts, dtype=np.float64)
+
+    # Nothing to optimize when the unconstrained mapping already fits in k blocks
+    nearest = np.unique(dist.argmin(axis=1))
+    if len(nearest) <= k:
+        return nearest
+
+    # BUILD: greedily add the entry that lowers the total cost the most
+    medoids = [int((weights @ dist).argmin())]
+    current = dist[:, medoids[0]]
+    while len(medoids) < k:
+        totals = weights @ np.minimum(current[:, None], dist)
+        totals[medoids] = np.inf
+        best = int(totals.argmin())
+        medoids.append(best)
+        current = np.minimum(current, dist[:, best])
+
+    # SWAP: replace a medoid with a nearby non-medoid while that lowers the total cost
+    neighbours = swap_candidates(matcher)
+    cost = float(weights @ current)
+    for _ in range(MAX_SWAP_PASSES):
+        d1, owner, d2 = _assignment_costs(dist, medoids)
+        best_cost, best_swap = cost, None
+        for slot in range(len(medoids)):
+            fallback = np.where(owner == slot, d2, d1)
+            candidates = neighbours[medoids[slot]]
+            totals = weights @ np.minimum(fallback[:, None], dist[:, candidates])
+            totals[np.isin(candidates, medoids)] = np.inf
+            best = int(totals.argmin())
+            if totals[best] < best_cost - 1e-6:
+                best_cost, best_swap = float(totals[best]), (slot, int(candidates[best]))
+        if best_swap is None:
+            break
+        medoids[best_swap[0]] = best_swap[1]
+        cost = best_cost
+    return np.sort(np.asarray(medoids, dtype=np.intp))
+
+
+def reduce_matcher(rgba, rects, matcher, k):
+    """A matcher restricted to the ``k`` blocks that best reproduce the texture's face colors."""
+    colors, counts = used_colors(rgba, rects)
+    return matcher.subset(choose_blocks(colors, counts, matcher, k))
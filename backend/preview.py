@@ -0,0 +1,262 @@
+import json
+import struct
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from block_faces import FACE_SHADE
+from voxels import VoxelGrid
+
+# Color of blocks the palette does not know
+UNKNOWN_COLOR = (125, 125, 125)
+
+# Facing of the faces whose normal points along (axis, positive)
+_FACE_FACINGS = {(0, True): "east", (0, False): "west", (1, True): "up", (1, False): "down",
+                 (2, True): "south", (2, False): "north"}
+
+# Side of the square PreviewImageData thumbnail, as Litematica makes them
+PREVIEW_SIZE = 140
+
+# Faces seen by the isometric view from above the statue's front right (south-east): up, south, east
+_VIEW_FACES = ((1, True), (2, True), (0, True))
+
+# glTF constants
+_FLOAT, _UNSIGNED_BYTE, _UNSIGNED_SHORT, _UNSIGNED_INT = 5126, 5121, 5123, 5125
+_ARRAY_BUFFER, _ELEMENT_ARRAY_BUFFER = 34962, 34963
+_ASSET = {"version": "2.0", "generator": "skin-to-litematic"}
+
+
+def palette_colors(palette, block_palette):
+    """
+    RGB of every grid palette entry, from the ``{(r, g, b): block_id}`` block palette
+    (block states take the color of their block).
+
+    :returns: uint8 array (len(palette), 3)
+    """
+    colors = {block_id: color for color, block_id in block_palette.items()}
+    return np.array([colors.get(identifier.partition("[")[0], UNKNOWN_COLOR) for identifier in palette],
+                    dtype=np.uint8).reshape(-1, 3)
+
+
+def _visible(solid, axis, positive):
+    """Solid voxels whose neighbour along ``axis`` on the ``positive`` (or negative) side is air or outside."""
+    neighbour = np.zeros_like(solid)
+    src = [slice(None)] * 3
+    dst = [slice(None)] * 3
+    if positive:
+        src[axis], dst[axis] = slice(1, None), slice(None, -1)
+    else:
+        src[axis], dst[axis] = slice(None, -1), slice(1, None)
+    neighbour[tuple(dst)] = solid[tuple(src)]
+    return solid & ~neighbour
+
+
+def _merge_faces(labels):
+    """
+    Rectangles covering the nonzero cells of every [a] layer of a (A, U, V) label array, one label each.
+    Runs of equal labels along V are found in one pass, then runs with the same span and label in
+    consecutive U rows are merged, so each rectangle is a greedy strip merge without a per-cell loop.
+
+    :returns: (a, u0, u1, v0, v1, label) arrays, with exclusive upper bounds
+    """
+    depth, rows, cols = labels.shape
+    flat = labels.reshape(-1, cols)
+    padded = np.pad(flat, ((0, 0), (1, 1)))
+    starts = (flat != 0) & (padded[:, 1:-1] != padded[:, :-2])
+    ends = (flat != 0) & (padded[:, 1:-1] != padded[:, 2:])
+    row, v0 = np.nonzero(starts)
+    _, v1 = np.nonzero(ends)
+    label = flat[row, v0]
+    a, u = np.divmod(row, rows)
+
+    order = np.lexsort((u, label, v1, v0, a))
+    a, u, v0, v1, label = a[order], u[order], v0[order], v1[order], label[order]
+    new = np.ones(len(a), dtype=bool)
+    new[1:] = ((a[1:] != a[:-1]) | (v0[1:] != v0[:-1]) | (v1[1:] != v1[:-1]) | (label[1:] != label[:-1])
+               | (u[1:] != u[:-1] + 1))
+    first = np.flatnonzero(new)
+    last = np.append(first[1:], len(a)) - 1
+    return a[first], u[first], u[last] + 1, v0[first], v1[first] + 1, label[first]
+
+
+def mesh_grid(grid, colors):
+    """
+    The visible block faces of a grid merged into quads of one color, in block units with y up.
+    Faces between two solid blocks are dropped and coplanar neighbouring faces of the same color
+    are merged (see :func:`_merge_faces`); colors are shaded by the direction each face points to,
+    the way Minecraft does.
+
+    :param colors:  uint8 (len(grid.palette), 3) colors, e.g. from :func:`palette_colors`
+    :returns:       float32 positions (4Q, 3), uint8 RGBA vertex colors (4Q, 4), triangle indices (6Q,)
+    """
+    unique, color_ids = np.unique(colors, axis=0, return_inverse=True)
+    lut = np.asarray(color_ids).ravel().astype(np.int32) + 1
+    lut[0] = 0
+    labels = lut[grid.blocks]
+    solid = labels != 0
+    positions, vertex_colors = [], []
+    for (axis, positive), facing in _FACE_FACINGS.items():
+        layer_labels = np.moveaxis(np.where(_visible(solid, axis, positive), labels, 0), axis, 0)
+        a, u0, u1, v0, v1, label = _merge_faces(layer_labels)
+        plane = a + positive
+        u_axis, v_axis = [i for i in range(3) if i != axis]
+        # Corners counter-clockwise seen from outside; u x v points along +axis except for y
+        corners = [(u0, v0), (u1, v0), (u1, v1), (u0, v1)]
+        if positive != (axis != 1):
+            corners.reverse()
+        quad = np.empty((len(a), 4, 3), dtype=np.float32)
+        for i, (u, v) in enumerate(corners):
+            quad[:, i, axis], quad[:, i, u_axis], quad[:, i, v_axis] = plane, u, v
+        shaded = np.round(unique[label - 1] * FACE_SHADE[facing]).astype(np.uint8)
+        rgba = np.concatenate([shaded, np.full((len(a), 1), 255, dtype=np.uint8)], axis=1)
+        positions.append(quad.reshape(-1, 3))
+        vertex_colors.append(np.repeat(rgba, 4, axis=0))
+    positions = np.concatenate(positions)
+    quads = len(positions) // 4
+    indices = (np.arange(quads)[:, None] * 4 + np.array([0, 1, 2, 0, 2, 3])).ravel()
+    return positions, np.concatenate(vertex_colors), indices
+
+
+def to_glb(positions, colors, indices, scale=1):
+    """
+    A binary glTF 2.0 of one unlit mesh with per-vertex colors, ``scale`` applied as the node transform
+    so the payload is the same at every scale.
+    """
+    index_type = _UNSIGNED_SHORT if len(positions) < 1 << 16 else _UNSIGNED_INT
+    indices = indices.astype(np.uint16 if index_type == _UNSIGNED_SHORT else np.uint32)
+    chunks = [np.ascontiguousarray(positions, dtype="<f4").tobytes(), np.ascontiguousarray(colors).tobytes(),
+              indices.astype(indices.dtype.newbyteorder("<")).tobytes()]
+    views, offset = [], 0
+    for data, target in zip(chunks, (_ARRAY_BUFFER, _ARRAY_BUFFER, _ELEMENT_ARRAY_BUFFER)):
+        views.append({"buffer": 0, "byteOffset": offset, "byteLength": len(data), "target": target})
+        offset += len(data) + (-len(data)) % 4
+    binary = b"".join(data + b"\0" * ((-len(data)) % 4) for data in chunks)
+
+    if not len(positions):
+        # glTF forbids empty buffer views, so an empty statue is a scene without a mesh
+        gltf, binary = {"asset": _ASSET, "scene": 0, "scenes": [{"nodes": [0]}], "nodes": [{}]}, b""
+    else:
+        gltf = {
+            "asset": _ASSET,
+            "extensionsUsed": ["KHR_materials_unlit"],
+            "scene": 0,
+            "scenes": [{"nodes": [0]}],
+            "nodes": [{"mesh": 0, "scale": [scale] * 3}],
+            "buffers": [{"byteLength": len(binary)}],
+            "bufferViews": views,
+            "accessors": [
+                {"bufferView": 0, "componentType": _FLOAT, "count": len(positions), "type": "VEC3",
+                 "min": positions.min(axis=0).tolist(), "max": positions.max(axis=0).tolist()},
+                {"bufferView": 1, "componentType": _UNSIGNED_BYTE, "normalized": True, "count": len(colors),
+                 "type": "VEC4"},
+                {"bufferView": 2, "componentType": index_type, "count": len(indices), "type": "SCALAR"},
+            ],
+            "materials": [{"pbrMetallicRoughness": {"metallicFactor": 0.0},
+                           "extensions": {"KHR_materials_unlit": {}}}],
+            "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "COLOR_0": 1}, "indices": 2, "material": 0}]}],
+        }
+    content = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    content += b" " * ((-len(content)) % 4)
+    glb = struct.pack("<I4s", len(content), b"JSON") + content
+    if binary:
+        glb += struct.pack("<I4s", len(binary), b"BIN\0") + binary
+    return struct.pack("<4sII", b"glTF", 2, 12 + len(glb)) + glb
+
+
+def statue_glb(grid, block_palette, scale=1):
+    """The greedy-meshed statue as binary glTF, see :func:`mesh_grid` and :func:`to_glb`."""
+    return to_glb(*mesh_grid(grid, palette_colors(grid.palette, block_palette)), scale)
+
+
+@lru_cache(maxsize=None)
+def _face_sprites(unit):
+    """
+    Pixel offsets of the top, south and east faces of a block drawn ``unit`` pixels wide per half tile,
+    relative to the projection of the block's top north-west corner. Pixel centres decide coverage,
+    so the faces of neighbouring blocks tile without gaps or overlaps.
+    """
+    half = unit // 2
+    py, px = np.mgrid[0:2 * half + unit, -unit:unit]
+    cx, cy = px.ravel() + 0.5, py.ravel() + 0.5
+    # Top: (cx, cy) = s * (unit, half) + t * (-unit, half)
+    s, t = (cx / unit + cy / half) / 2, (cy / half - cx / unit) / 2
+    top = (s >= 0) & (s < 1) & (t >= 0) & (t < 1)
+    # South: from (-unit, half), s * (unit, half) along x then r * unit down
+    s = (cx + unit) / unit
+    r = (cy - half - s * half) / unit
+    south = (s >= 0) & (s < 1) & (r >= 0) & (r < 1)
+    # East: from (unit, half), t * (-unit, half) along z then r * unit down
+    t = (unit - cx) / unit
+    r = (cy - half - t * half) / unit
+    east = (t >= 0) & (t < 1) & (r >= 0) & (r < 1)
+    offsets = np.stack([px.ravel(), py.ravel()], axis=1)
+    return tuple(offsets[mask] for mask in (top, south, east))
+
+
+def _project(blocks, unit):
+    """Screen corner of every visible voxel's top north-west corner, its depth towards the viewer and its faces."""
+    solid = blocks != 0
+    for (axis, positive), sprite in zip(_VIEW_FACES, _face_sprites(unit)):
+        x, y, z = np.nonzero(_visible(solid, axis, positive))
+        yield x, y, z, sprite, _FACE_FACINGS[axis, positive]
+
+
+def render_preview(grids, block_palette, size=PREVIEW_SIZE):
+    """
+    An isometric view of grids placed at their origins, from above their front right, as a ``size``² RGBA image
+    with a transparent background. Only faces open to air are drawn: each one is a fixed pixel sprite
+    shaded like Minecraft shades that direction, and overlapping pixels keep the face nearest the viewer
+    (largest x + y + z, exact for this projection) after one sort of all pixel writes. The picture is drawn
+    at twice ``size`` and scaled down, so the cost follows the number of surface voxels.
+
+    :param block_palette:   ``{(r, g, b): block_id}`` giving the block colors, see :func:`palette_colors`
+    """
+    grids = [grid for grid in grids if grid.blocks.size]
+    image = Image.new("RGBA", (size, size))
+    if not grids:
+        return image
+    lo = np.min([grid.origin for grid in grids], axis=0)
+    hi = np.max([np.add(grid.origin, grid.blocks.shape) for grid in grids], axis=0)
+    width, height, length = (hi - lo).tolist()
+    # Projected extent: (width + length) half tiles across, half that plus the height down
+    extent = max(width + length, (width + length) // 2 + height)
+    step = -(-extent // size)
+    if step > 1:
+        # Too large for two pixels per half tile: draw every step-th voxel instead
+        grids = [VoxelGrid(grid.blocks[::step, ::step, ::step], grid.palette, tuple((np.subtract(grid.origin, lo)
+                 + step - 1) // step)) for grid in grids]
+        return render_preview(grids, block_palette, size)
+    unit = max(2, 2 * size // extent // 2 * 2)
+
+    pixels, depths, colors = [], [], []
+    for grid in grids:
+        palette = palette_colors(grid.palette, block_palette)
+        ox, oy, oz = np.subtract(grid.origin, lo).tolist()
+        for x, y, z, sprite, facing in _project(grid.blocks, unit):
+            color = np.round(palette[grid.blocks[x, y, z]] * FACE_SHADE[facing]).astype(np.uint8)
+            x, y, z = x + ox, y + oy, z + oz
+            sx = (x - z + length) * unit
+            sy = (x + z) * (unit // 2) + (height - y - 1) * unit
+            pixels.append(((sy[:, None] + sprite[:, 1]) * (width + length) * unit + sx[:, None] + sprite[:, 0]).ravel())
+            depths.append(np.repeat(x + y + z, len(sprite)))
+            colors.append(np.repeat(color, len(sprite), axis=0))
+    pixels, depths, colors = np.concatenate(pixels), np.concatenate(depths), np.concatenate(colors)
+    order = np.lexsort((depths, pixels))
+    pixels = pixels[order]
+    nearest = np.append(pixels[1:] != pixels[:-1], True)
+
+    canvas_width, canvas_height = (width + length) * unit, (width + length) * (unit // 2) + height * unit
+    canvas = np.zeros((canvas_height * canvas_width, 4), dtype=np.uint8)
+    canvas[pixels[nearest], :3] = colors[order[nearest]]
+    canvas[pixels[nearest], 3] = 255
+    render = Image.fromarray(canvas.reshape(canvas_height, canvas_width, 4), "RGBA")
+    render.thumbnail((size, size), Image.LANCZOS)
+    image.paste(render, ((size - render.width) // 2, (size - render.height) // 2))
+    return image
+
+
+def preview_image_data(image):
+    """The ARGB pixels of an RGBA image, row by row, as Litematica stores them in ``PreviewImageData``."""
+    rgba = np.asarray(image.convert("RGBA"), dtype=np.uint32).reshape(-1, 4)
+    return ((rgba[:, 3] << 24) | (rgba[:, 0] << 16) | (rgba[:, 1] << 8) | rgba[:, 2]).view(np.int32)
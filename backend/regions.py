@@ -0,0 +1,126 @@
+import numpy as np
+
+from voxels import AIR, VoxelGrid, index_dtype
+
+
+class Region:
+    """
+    An editable box of blocks, for tooling that changes schematics after conversion.
+    Blocks are palette indices indexed [x, y, z] (air at index 0) in the smallest dtype holding the palette,
+    promoted from uint8 to uint16 to uint32 as blocks are added. A dict from identifier to palette index
+    is kept alongside the palette, so setting blocks never scans it, and per-entry block counts are cached
+    until the next write (writing to :attr:`blocks` directly must be followed by :meth:`invalidate`).
+    """
+
+    def __init__(self, width, height, length, origin=(0, 0, 0)):
+        self.blocks = np.zeros((width, height, length), dtype=np.uint8)
+        self.palette = [AIR]
+        self._index = {AIR: 0}
+        self._counts = None
+        self.origin = origin
+
+    @classmethod
+    def from_grid(cls, grid):
+        region = cls.__new__(cls)
+        region.blocks = grid.blocks.astype(index_dtype(len(grid.palette)), copy=True)
+        region.palette = list(grid.palette)
+        region._index = {identifier: i for i, identifier in enumerate(region.palette)}
+        region._counts = None
+        region.origin = grid.origin
+        return region
+
+    def grid(self):
+        return VoxelGrid(self.blocks, self.palette, self.origin)
+
+    @property
+    def shape(self):
+        return self.blocks.shape
+
+    def index_of(self, identifier):
+        """Palette index of a block identifier, adding it to the palette (and widening the dtype) if needed."""
+        index = self._index.get(identifier)
+        if index is not None:
+            return index
+        self.palette.append(identifier)
+        self._index[identifier] = len(self.palette) - 1
+        dtype = index_dtype(len(self.palette))
+        if dtype != self.blocks.dtype:
+            self.blocks = self.blocks.astype(dtype)
+        return len(self.palette) - 1
+
+    def __getitem__(self, key):
+        """The identifier at ``[x, y, z]``, or an array of palette indices for slices."""
+        indices = self.blocks[key]
+        if np.ndim(indices):
+            return indices
+        return self.palette[indices]
+
+    def __setitem__(self, key, identifier):
+        """Sets one block, or every block of a sliced box, to a block identifier."""
+        self.blocks[key] = self.index_of(identifier)
+        self._counts = None
+
+    def invalidate(self):
+        """Drops the cached block counts after :attr:`blocks` was modified directly."""
+        self._counts = None
+
+    def counts(self):
+        """Number of blocks per palette entry, counted once per write."""
+        if self._counts is None:
+            self._counts = np.bincount(self.blocks.ravel(), minlength=len(self.palette))
+        return self._counts
+
+    def count(self, identifier):
+        index = self._index.get(identifier)
+        if index is None or index >= len(self.counts()):
+            return 0
+        return int(self.counts()[index])
+
+    def __contains__(self, identifier):
+        return self.count(identifier) > 0
+
+    def remap(self, mapping):
+        """
+        Replaces blocks in one pass through a palette lookup table. ``mapping`` is a dict from old to new
+        identifiers or a function of the old identifier; the palette keeps unused entries until
+        :meth:`optimize_palette`.
+        """
+        if not callable(mapping):
+            mapping = {k: v for k, v in mapping.items() if k in self._index and k != v}
+            if not mapping:
+                return
+            mapping = mapping.get
+        targets = [mapping(identifier) for identifier in list(self.palette)]
+        lut = np.array([i if new is None else self.index_of(new) for i, new in enumerate(targets)])
+        if (lut != np.arange(len(lut))).any():
+            self.blocks = lut.astype(self.blocks.dtype)[self.blocks]
+            self._counts = None
+
+    def replace(self, old, new):
+        """Turns every ``old`` block into ``new``."""
+        old_index = self._index.get(old)
+        if old_index is None or old == new:
+            return
+        if new not in self._index and old_index:
+            # Renaming the palette entry is enough (air keeps index 0)
+            del self._index[old]
+            self.palette[old_index] = new
+            self._index[new] = old_index
+            return
+        self.remap({old: new})
+
+    def filter(self, keep):
+        """Turns every block whose identifier fails ``keep(identifier)`` into air."""
+        self.remap(lambda identifier: None if identifier == AIR or keep(identifier) else AIR)
+
+    def optimize_palette(self):
+        """Removes palette entries no block uses (air stays at index 0) and narrows the dtype to match."""
+        used = self.counts() > 0
+        used[0] = True
+        if used.all():
+            return
+        lut = np.cumsum(used) - 1
+        self.palette = [identifier for identifier, u in zip(self.palette, used) if u]
+        self._index = {identifier: i for i, identifier in enumerate(self.palette)}
+        self.blocks = lut.astype(index_dtype(len(self.palette)))[self.blocks]
+        self._counts = None
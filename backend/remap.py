@@ -0,0 +1,165 @@
+import argparse
+import os
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+from batch import parallel_map
+from block_faces import block_orientation, noise_penalties
+from compression import DEFAULT_COMPRESSLEVEL
+from export_formats import SCHEMATIC_AUTHOR, SCHEMATIC_NAME, save_regions
+from litematic_reader import Litematic
+from matcher import get_matcher
+from palette_profiles import get_palette_profiles, get_profile_palette
+from preview import preview_image_data, render_preview
+from regions import Region
+from schematic_diff import litematic_files
+from skin_to_litematic import PALETTE_FILE, get_block_faces, get_block_palette
+from voxels import AIR
+
+
+@lru_cache(maxsize=None)
+def load_palette_file(path):
+    """``({(r, g, b): block_id}, {block_id: entry})`` of a palette file, read once per process."""
+    return get_block_palette(path), get_block_faces(path)
+
+
+def block_colors(palette):
+    """The color of every block of a ``{(r, g, b): block_id}`` palette."""
+    return {block_id: color for color, block_id in palette.items()}
+
+
+def remap_identifiers(identifiers, old_palette, new_palette, new_faces=None, profile=None, noise_weight=0.0):
+    """
+    The block each identifier becomes under the new palette: its color in the old palette (the new one
+    for blocks the old one lacks), matched against the new palette. Only the distinct identifiers are
+    matched, a handful per statue. Block states (``axis``, ``facing``) are kept when the new block is
+    oriented the same way.
+
+    :returns: ``{identifier: new identifier}`` of the identifiers that change, and the identifiers
+              whose color is unknown (left as they are)
+    """
+    new_faces = new_faces or {}
+    if profile:
+        new_palette = get_profile_palette(new_palette, profile)
+    penalties = noise_penalties(new_palette, new_faces, noise_weight) if noise_weight else None
+    matcher = get_matcher(new_palette, penalties)
+    old_colors, new_colors = block_colors(old_palette), block_colors(new_palette)
+
+    known, colors, unknown = [], [], []
+    for identifier in identifiers:
+        if identifier == AIR:
+            continue
+        block_id = identifier.partition("[")[0]
+        color = old_colors.get(block_id, new_colors.get(block_id))
+        if color is None:
+            unknown.append(identifier)
+        else:
+            known.append(identifier)
+            colors.append(color)
+    if not known:
+        return {}, unknown
+
+    mapping = {}
+    matches = matcher.match(np.array(colors, dtype=np.uint8))
+    for identifier, index in zip(known, matches.tolist()):
+        block_id, bracket, state = identifier.partition("[")
+        new_id = matcher.block_ids[index]
+        if state and block_orientation(new_id, new_faces.get(new_id, {})) == \
+                block_orientation(block_id, new_faces.get(block_id, {})):
+            new_id += bracket + state
+        if new_id != identifier:
+            mapping[identifier] = new_id
+    return mapping, unknown
+
+
+def remap_file(path, output_path, old_palette_file, new_palette_file=PALETTE_FILE, profile=None, noise_weight=0.0,
+               compresslevel=DEFAULT_COMPRESSLEVEL, threads=1):
+    """
+    Rewrites a .litematic for a new palette through :meth:`regions.Region.remap`, which substitutes palette
+    entries with one lookup-table pass per region, keeping region names and positions and the source's
+    metadata. The output is written on ``threads`` threads (None for one per CPU).
+
+    :returns: {"changed": blocks whose identifier changed, "mapping": {old: new}, "unknown": [identifiers]}
+    """
+    old_palette, _ = load_palette_file(old_palette_file)
+    new_palette, new_faces = load_palette_file(new_palette_file)
+    litematic = Litematic.load(path)
+    regions = litematic.regions
+    identifiers = sorted({identifier for region in regions.values() for identifier in region.palette})
+    mapping, unknown = remap_identifiers(identifiers, old_palette, new_palette, new_faces, profile, noise_weight)
+
+    changed = 0
+    grids = {}
+    for name, litematic_region in regions.items():
+        region = Region.from_grid(litematic_region.grid())
+        counts = region.counts()
+        changed += sum(int(counts[i]) for i, identifier in enumerate(region.palette) if identifier in mapping)
+        region.remap(mapping)
+        region.optimize_palette()
+        grids[name] = region.grid()
+    preview = preview_image_data(render_preview(grids.values(), new_palette))
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    save_regions(grids, output_path, compresslevel, threads, name=litematic.name or SCHEMATIC_NAME, preview=preview,
+                 author=litematic.author or SCHEMATIC_AUTHOR, source=litematic.header)
+    return {"changed": changed, "mapping": mapping, "unknown": unknown}
+
+
+def _remap_job(job):
+    return remap_file(*job)
+
+
+def remap_dir(src_dir, dst_dir, old_palette_file, new_palette_file=PALETTE_FILE, profile=None, noise_weight=0.0,
+              workers=None):
+    """
+    :func:`remap_file` of every .litematic under ``src_dir`` into the same relative path under ``dst_dir``,
+    on a process pool (see :func:`batch.parallel_map`) where each worker reads the palettes once.
+
+    :returns: {relative path: :func:`remap_file` result}
+    """
+    paths = litematic_files(src_dir)
+    jobs = [(os.path.join(src_dir, path), os.path.join(dst_dir, path), old_palette_file, new_palette_file, profile,
+             noise_weight) for path in paths]
+    chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+    return dict(zip(paths, parallel_map(_remap_job, jobs, workers, chunksize=chunksize)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-match existing .litematic statues against a new block palette, "
+                                                 "without their source skins.")
+    parser.add_argument("input", help=".litematic file, or directory of them")
+    parser.add_argument("-o", "--output", required=True, help="output file, or directory for a directory input")
+    parser.add_argument("--old-palette", required=True, metavar="JSON",
+                        help="palette file the statues were converted with")
+    parser.add_argument("--new-palette", default=PALETTE_FILE, metavar="JSON",
+                        help=f"palette file to convert to (default {PALETTE_FILE})")
+    parser.add_argument("--profile", choices=sorted(get_palette_profiles()), help="as in skin_to_litematic.py")
+    parser.add_argument("--noise-weight", type=float, default=0.0, help="as in skin_to_litematic.py")
+    parser.add_argument("--workers", type=int, help="processes for a directory input (default: one per CPU)")
+    args = parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.noise_weight < 0:
+        parser.error("--noise-weight must not be negative")
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        parser.error("--output must differ from the input")
+    for path in (args.input, args.old_palette, args.new_palette):
+        if not os.path.exists(path):
+            print(f"Error: {path} not found")
+            sys.exit(1)
+
+    if os.path.isdir(args.input):
+        results = remap_dir(args.input, args.output, args.old_palette, args.new_palette, args.profile,
+                            args.noise_weight, args.workers)
+    else:
+        results = {os.path.basename(args.input): remap_file(args.input, args.output, args.old_palette,
+                                                            args.new_palette, args.profile, args.noise_weight,
+                                                            threads=None)}
+    for path, result in results.items():
+        print(f"{path}: {result['changed']} blocks changed")
+        for old, new in sorted(result["mapping"].items()):
+            print(f"  {old} -> {new}")
+        if result["unknown"]:
+            print(f"  not in either palette, kept: {', '.join(result['unknown'])}")
+    print(f"Remapped {len(results)} schematics to {args.output}")
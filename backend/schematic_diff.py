@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+
+from batch import parallel_map
+from compression import DEFAULT_COMPRESSLEVEL
+from export_formats import save_regions
+from litematic_reader import Litematic
+from voxels import AIR, VoxelGrid, index_dtype
+
+
+def unify_palettes(palette_a, palette_b):
+    """
+    The union of two palettes (air first, then sorted) and a lookup table from each palette into it,
+    so index arrays of both can be compared directly.
+    """
+    palette = [AIR] + sorted((set(palette_a) | set(palette_b)) - {AIR})
+    index = {identifier: i for i, identifier in enumerate(palette)}
+    dtype = index_dtype(len(palette))
+    return (palette, np.array([index[i] for i in palette_a], dtype=dtype),
+            np.array([index[i] for i in palette_b], dtype=dtype))
+
+
+def align(grid_a, grid_b, lut_a, lut_b):
+    """Both grids' unified palette indices over the box enclosing both (air outside each), and its corner."""
+    if grid_a.origin == grid_b.origin and grid_a.blocks.shape == grid_b.blocks.shape:
+        return lut_a[grid_a.blocks], lut_b[grid_b.blocks], tuple(grid_a.origin)
+    lo = np.minimum(grid_a.origin, grid_b.origin)
+    hi = np.maximum(np.add(grid_a.origin, grid_a.blocks.shape), np.add(grid_b.origin, grid_b.blocks.shape))
+    aligned = []
+    for grid, lut in ((grid_a, lut_a), (grid_b, lut_b)):
+        blocks = np.zeros(tuple(hi - lo), dtype=lut.dtype)
+        x, y, z = np.subtract(grid.origin, lo)
+        w, h, l = grid.blocks.shape
+        blocks[x:x + w, y:y + h, z:z + l] = lut[grid.blocks]
+        aligned.append(blocks)
+    return aligned[0], aligned[1], tuple(int(c) for c in lo)
+
+
+def diff_grids(grid_a, grid_b, changes=False, removed=AIR):
+    """
+    Compares two grids placed at their origins, in one vectorized pass over the unified index arrays.
+
+    :param changes: also build a grid holding only the changed voxels, with their new block
+                    (or ``removed`` where a block became air)
+    :returns: (``Counter`` of changed voxels per ``(old, new)`` identifier pair, number of voxels compared,
+              changes grid or None)
+    """
+    palette, lut_a, lut_b = unify_palettes(grid_a.palette, grid_b.palette)
+    a, b, origin = align(grid_a, grid_b, lut_a, lut_b)
+    changed = a != b
+    old, new = a[changed].astype(np.int64), b[changed].astype(np.int64)
+    codes, counts = np.unique(old * len(palette) + new, return_counts=True)
+    pairs = Counter({(palette[code // len(palette)], palette[code % len(palette)]): int(count)
+                     for code, count in zip(codes.tolist(), counts.tolist())})
+    changes_grid = None
+    if changes and changed.any():
+        if removed != AIR and removed not in palette:
+            palette = palette + [removed]
+        blocks = np.zeros(a.shape, dtype=index_dtype(len(palette)))
+        blocks[changed] = np.where(new == 0, palette.index(removed), new)
+        changes_grid = VoxelGrid(blocks, palette, origin)
+    return pairs, a.size, changes_grid
+
+
+def _empty_like(region):
+    return VoxelGrid(np.zeros(region.shape, dtype=np.uint8), [AIR], region.origin)
+
+
+def _pair_regions(regions_a, regions_b):
+    """``[(name, region_a or None, region_b or None)]``, by region name; two single regions pair whatever their names."""
+    if len(regions_a) == 1 and len(regions_b) == 1:
+        (_, a), (name, b) = next(iter(regions_a.items())), next(iter(regions_b.items()))
+        return [(name, a, b)]
+    names = list(regions_a) + [name for name in regions_b if name not in regions_a]
+    return [(name, regions_a.get(name), regions_b.get(name)) for name in names]
+
+
+def diff_files(path_a, path_b, changes_path=None, removed=AIR, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """
+    Compares two .litematic files region by region. Regions with the same palette and identical packed block
+    states are skipped without unpacking them. With ``changes_path``, a schematic holding only the changed
+    voxels of every changed region is written there when anything changed.
+
+    :returns: {"changed": voxels changed, "volume": voxels compared, "pairs": Counter of (old, new) pairs}
+    """
+    regions_a, regions_b = Litematic.load(path_a).regions, Litematic.load(path_b).regions
+    result = {"changed": 0, "volume": 0, "pairs": Counter()}
+    changes = {}
+    for name, a, b in _pair_regions(regions_a, regions_b):
+        if (a is not None and b is not None and a.palette == b.palette and a.size == b.size
+                and a.position == b.position and np.array_equal(a.nbt["BlockStates"], b.nbt["BlockStates"])):
+            result["volume"] += a.volume
+            continue
+        grid_a = a.grid() if a is not None else _empty_like(b)
+        grid_b = b.grid() if b is not None else _empty_like(a)
+        pairs, volume, changes_grid = diff_grids(grid_a, grid_b, changes_path is not None, removed)
+        result["changed"] += sum(pairs.values())
+        result["volume"] += volume
+        result["pairs"].update(pairs)
+        if changes_grid is not None:
+            changes[name] = changes_grid
+    if changes:
+        os.makedirs(os.path.dirname(changes_path) or ".", exist_ok=True)
+        save_regions(changes, changes_path, compresslevel, 1, name="Changes")
+    return result
+
+
+def _diff_job(job):
+    return diff_files(*job)
+
+
+def litematic_files(directory):
+    """Paths of the .litematic files under ``directory``, relative to it, sorted."""
+    return sorted(os.path.relpath(os.path.join(root, name), directory)
+                  for root, _, names in os.walk(directory) for name in names if name.endswith(".litematic"))
+
+
+def diff_dirs(dir_a, dir_b, changes_dir=None, removed=AIR, workers=None):
+    """
+    Compares the .litematic files with the same relative path in two directory trees on a process pool
+    (see :func:`batch.parallel_map`), writing changes-only schematics under ``changes_dir`` when given.
+
+    :returns: ({relative path: :func:`diff_files` result}, paths only in ``dir_a``, paths only in ``dir_b``)
+    """
+    files_a, files_b = litematic_files(dir_a), litematic_files(dir_b)
+    common = sorted(set(files_a) & set(files_b))
+    jobs = [(os.path.join(dir_a, path), os.path.join(dir_b, path),
+             os.path.join(changes_dir, path) if changes_dir else None, removed) for path in common]
+    chunksize = max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))
+    results = dict(zip(common, parallel_map(_diff_job, jobs, workers, chunksize=chunksize)))
+    return results, sorted(set(files_a) - set(files_b)), sorted(set(files_b) - set(files_a))
+
+
+def print_report(results, only_a=(), only_b=(), top=20):
+    pairs = sum((result["pairs"] for result in results.values()), Counter())
+    changed = [path for path, result in results.items() if result["changed"]]
+    for path in changed:
+        print(f"{path}: {results[path]['changed']} of {results[path]['volume']} voxels changed")
+    for path in only_a:
+        print(f"{path}: only in old")
+    for path in only_b:
+        print(f"{path}: only in new")
+    print(f"Changed voxels: {sum(pairs.values())} in {len(changed)} of {len(results)} schematics")
+    for (old, new), count in pairs.most_common(top):
+        print(f"  {old} -> {new}: {count}")
+
+
+def report_json(results, only_a=(), only_b=()):
+    pairs = sum((result["pairs"] for result in results.values()), Counter())
+    return {
+        "files": {path: {"changed": result["changed"], "volume": result["volume"]} for path, result in results.items()},
+        "only_old": list(only_a),
+        "only_new": list(only_b),
+        "pairs": [{"old": old, "new": new, "count": count} for (old, new), count in pairs.most_common()],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the blocks that changed between two .litematic files "
+                                                 "or two directories of them.")
+    parser.add_argument("old", help="old .litematic, or directory of them")
+    parser.add_argument("new", help="new .litematic, or directory of them")
+    parser.add_argument("--changes", metavar="PATH",
+                        help="write a schematic holding only the changed voxels (a directory when comparing directories)")
+    parser.add_argument("--removed", default=AIR, metavar="BLOCK",
+                        help="block marking voxels that became air in the changes schematic (default: left as air)")
+    parser.add_argument("--workers", type=int, help="comparison processes for directories (default: one per CPU)")
+    parser.add_argument("--top", type=int, default=20, help="block pairs listed (default 20)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    for path in (args.old, args.new):
+        if not os.path.exists(path):
+            print(f"Error: {path} not found")
+            sys.exit(1)
+
+    if os.path.isdir(args.old) and os.path.isdir(args.new):
+        report = diff_dirs(args.old, args.new, args.changes, args.removed, args.workers)
+    elif os.path.isfile(args.old) and os.path.isfile(args.new):
+        report = ({os.path.basename(args.new): diff_files(args.old, args.new, args.changes, args.removed)},)
+    else:
+        parser.error("compare two files or two directories")
+    if args.json:
+        print(json.dumps(report_json(*report), indent=2))
+    else:
+        print_report(*report, top=args.top)
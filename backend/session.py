@@ -0,0 +1,189 @@
+import numpy as np
+from PIL import Image
+
+import skin_to_litematic
+from block_faces import FACINGS, get_facing_matchers, noise_penalties
+from compression import DEFAULT_COMPRESSLEVEL, open_compressed
+from export_formats import deterministic_timestamp, open_output, write_litematic
+from matcher import ALPHA_THRESHOLD, get_matcher
+from nbt_stream import NBTWriter
+from palette_profiles import get_profile_palette
+from preview import preview_image_data, render_preview
+from regions import Region
+from skin_to_litematic import FACE_FACINGS, map_skin_blocks, texel_voxel_map
+from voxels import AIR, pack_bits
+
+SKIN_SIZE = 64
+
+
+def _texel_facings():
+    """Index into FACINGS of the statue side every texel lands on, -1 for texels no face uses."""
+    facings = np.full((SKIN_SIZE, SKIN_SIZE), -1, dtype=np.int8)
+    for i, facing in enumerate(FACINGS):
+        for (u, v, w, h), rect_facing in FACE_FACINGS.items():
+            if rect_facing == facing:
+                facings[v:v + h, u:u + w] = i
+    return facings.ravel()
+
+
+def _csr(keys, size):
+    """Write indices sorted by ``keys`` (keeping write order within a key) and the start of each key's run."""
+    order = np.argsort(keys, kind="stable")
+    return order, np.searchsorted(keys[order], np.arange(size + 1))
+
+
+def _gather(order, starts, keys):
+    """The concatenated runs of ``keys`` in a :func:`_csr` index, and the position of each key's run owner."""
+    lengths = starts[keys + 1] - starts[keys]
+    owner = np.repeat(np.arange(len(keys)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return order[starts[keys][owner] + offsets], owner
+
+
+class ConversionSession:
+    """
+    A conversion kept alive between edits of the same skin: the texture, the block matched to every texel,
+    the voxel grid and its packed Litematica block states. :meth:`update` re-matches only the texels
+    that changed, recomputes only the voxels they are written to, and re-packs only the words holding those voxels.
+
+    Dithering and ``max_blocks`` depend on the whole skin, so with them every texel is re-matched;
+    the grid and the packed words are still only touched where blocks changed.
+    The grid spans every voxel a skin can fill, so its size never changes between edits.
+    """
+
+    def __init__(self, skin_image, dither="none", max_blocks=None, profile=None, facing_aware=False, shading=1.0,
+                 noise_weight=0.0):
+        self.options = {"dither": dither, "max_blocks": max_blocks, "profile": profile, "facing_aware": facing_aware,
+                        "shading": shading, "noise_weight": noise_weight}
+        self.incremental = dither in (None, "none") and max_blocks is None
+        self._matchers = self._build_matchers() if self.incremental else None
+        self._facings = _texel_facings()
+
+        v, u, x, y, z = texel_voxel_map()
+        coords = np.stack([x, y, z])
+        mins = coords.min(axis=1)
+        shape = tuple(int(s) for s in coords.max(axis=1) - mins + 1)
+        self.region = Region(*shape, origin=tuple(int(m) for m in mins))
+        self._write_texel = v * SKIN_SIZE + u
+        self._write_voxel = np.ravel_multi_index(tuple(coords - mins[:, None]), shape)
+        self._by_texel = _csr(self._write_texel, SKIN_SIZE * SKIN_SIZE)
+        self._by_voxel = _csr(self._write_voxel, self.region.blocks.size)
+        # Position of every [x, y, z] voxel in the y, z, x order of the packed block states
+        width, height, length = shape
+        gx, gy, gz = np.unravel_index(np.arange(self.region.blocks.size), shape)
+        self._yzx = (gy * width * length + gz * width + gx).astype(np.int64)
+        self._voxel_at = np.argsort(self._yzx)
+
+        self.rgba = np.zeros((SKIN_SIZE, SKIN_SIZE, 4), dtype=np.uint8)
+        self.texels = np.zeros(SKIN_SIZE * SKIN_SIZE, dtype=np.int64)
+        self._set_rgba(self._load(skin_image), np.arange(SKIN_SIZE * SKIN_SIZE))
+        self._nbits = self.region.grid().nbits()
+        self.words = pack_bits(self.region.grid().yzx_indices(), self._nbits)
+
+    def _build_matchers(self):
+        options = self.options
+        palette = skin_to_litematic.BLOCK_PALETTE
+        if options["profile"]:
+            palette = get_profile_palette(palette, options["profile"])
+        if options["facing_aware"]:
+            return get_facing_matchers(palette, skin_to_litematic.BLOCK_FACES, options["shading"],
+                                       options["noise_weight"])
+        penalties = noise_penalties(palette, skin_to_litematic.BLOCK_FACES, options["noise_weight"]) \
+            if options["noise_weight"] else None
+        return get_matcher(palette, penalties)
+
+    @staticmethod
+    def _load(skin_image):
+        image = skin_image.convert("RGBA")
+        if image.size != (SKIN_SIZE, SKIN_SIZE):
+            image = image.resize((SKIN_SIZE, SKIN_SIZE))
+        return np.asarray(image, dtype=np.uint8)
+
+    def _match(self, rgba, texels):
+        """Block identifiers of the given flat texel indices, matched the way map_skin_blocks does."""
+        pixels = rgba.reshape(-1, 4)[texels]
+        ids = np.full(len(texels), AIR, dtype=object)
+        if self.options["facing_aware"]:
+            for i, facing in enumerate(FACINGS):
+                sel = self._facings[texels] == i
+                if sel.any():
+                    matcher = self._matchers[facing]
+                    ids[sel] = np.array(matcher.block_ids, dtype=object)[matcher.match(pixels[sel, :3])]
+        else:
+            ids[:] = np.array(self._matchers.block_ids, dtype=object)[self._matchers.match(pixels[:, :3])]
+        ids[pixels[:, 3] < ALPHA_THRESHOLD] = AIR
+        return ids
+
+    def _set_rgba(self, rgba, texels):
+        """Stores a new texture whose changed texels are ``texels`` and propagates their blocks to the grid."""
+        self.rgba = rgba
+        if self.incremental:
+            ids = self._match(rgba, texels)
+        else:
+            texels = np.arange(SKIN_SIZE * SKIN_SIZE)
+            ids = map_skin_blocks(Image.fromarray(rgba, "RGBA"), skin_to_litematic.BLOCK_PALETTE,
+                                  **self.options).ravel()
+        indices = np.array([self.region.index_of(i) for i in ids], dtype=np.int64)
+        changed = indices != self.texels[texels]
+        texels, indices = texels[changed], indices[changed]
+        self.texels[texels] = indices
+        if not len(texels):
+            return np.empty(0, dtype=np.int64)
+
+        # Voxels the changed texels are written to, then all the writes to those voxels
+        writes, _ = _gather(*self._by_texel, texels)
+        voxels = np.unique(self._write_voxel[writes])
+        writes, owner = _gather(*self._by_voxel, voxels)
+        solid = self.texels[self._write_texel[writes]] != 0
+        last = np.full(len(voxels), -1, dtype=np.int64)
+        np.maximum.at(last, owner[solid], writes[solid])
+        values = np.where(last >= 0, self.texels[self._write_texel[np.maximum(last, 0)]], 0)
+
+        flat = self.region.blocks.reshape(-1)
+        moved = flat[voxels] != values
+        voxels = voxels[moved]
+        flat[voxels] = values[moved]
+        self.region.invalidate()
+        return voxels
+
+    def _repack(self, voxels):
+        """Re-packs the words holding the given voxels: each run of 64 values fills exactly ``nbits`` words."""
+        grid = self.region.grid()
+        nbits = grid.nbits()
+        if nbits != self._nbits:
+            self._nbits = nbits
+            self.words = pack_bits(grid.yzx_indices(), nbits)
+            return
+        runs = np.unique(self._yzx[voxels] // 64)
+        positions = (runs[:, None] * 64 + np.arange(64)).ravel()
+        values = np.zeros(len(positions), dtype=np.uint64)
+        inside = positions < len(self._voxel_at)
+        values[inside] = self.region.blocks.reshape(-1)[self._voxel_at[positions[inside]]]
+        words = (runs[:, None] * nbits + np.arange(nbits)).ravel()
+        inside = words < len(self.words)
+        self.words[words[inside]] = pack_bits(values, nbits)[inside]
+
+    def update(self, skin_image):
+        """
+        Applies an edited skin.
+
+        :returns: the number of voxels whose block changed
+        """
+        rgba = self._load(skin_image)
+        texels = np.flatnonzero((rgba != self.rgba).any(axis=-1))
+        if not len(texels):
+            return 0
+        voxels = self._set_rgba(rgba, texels)
+        if len(voxels):
+            self._repack(voxels)
+        return len(voxels)
+
+    def grid(self):
+        return self.region.grid()
+
+    def save(self, path, compresslevel=DEFAULT_COMPRESSLEVEL, deterministic=False):
+        """Writes the current statue as a .litematic from the kept block states, without packing them again."""
+        timestamp = deterministic_timestamp() if deterministic else None
+        preview = preview_image_data(render_preview([self.grid()], skin_to_litematic.BLOCK_PALETTE))
+        with open_output(path) as f, open_compressed(f, compresslevel, 1, 0 if deterministic else None) as gz:
+            write_litematic(self.grid(), NBTWriter(gz), timestamp, words=self.words, preview=preview)
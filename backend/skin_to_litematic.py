@@ -1,41 +1,73 @@
 import sys
 import math
-from PIL import Image
-import litemapy
+import argparse
+from PIL import Image, UnidentifiedImageError
+import numpy as np
 
 import json
 import os
+from functools import lru_cache
+
+from matcher import ALPHA_THRESHOLD, get_matcher
+from dithering import DITHER_MODES, dither_texture
+from palette_reduction import reduce_matcher
+from palette_profiles import get_palette_profiles, get_profile_palette
+from block_faces import FACINGS, get_facing_matchers, noise_penalties
+from voxels import SPARSE_MIN_VOLUME, ChunkedGrid, VoxelGrid
+from export_formats import EXPORT_FORMATS, save_grid
+from preview import preview_image_data, render_preview
+from compression import DEFAULT_COMPRESSLEVEL
 
 # Load Block Palette from JSON
 PALETTE_FILE = "block_palette.json"
 
-def get_block_palette():
-    if not os.path.exists(PALETTE_FILE):
-        print(f"Error: {PALETTE_FILE} not found. Please run fetch_palette.py first.")
+def get_block_palette(path=PALETTE_FILE):
+    if not os.path.exists(path):
+        print(f"Error: {path} not found. Please run fetch_palette.py first.")
         sys.exit(1)
         
-    with open(PALETTE_FILE, 'r') as f:
+    with open(path, 'r') as f:
         data = json.load(f)
         
     palette = {}
     for rgb_str, block_id in data.items():
         r, g, b = map(int, rgb_str.split(','))
-        palette[(r, g, b)] = block_id
+        # Entries are either a block id or an object with the id and per-face colors
+        palette[(r, g, b)] = block_id if isinstance(block_id, str) else block_id["id"]
         
     return palette
 
+def get_block_faces(path=PALETTE_FILE):
+    """Per-face colors of the palette entries that have them, as {block_id: entry}."""
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    return {entry["id"]: entry for entry in data.values() if isinstance(entry, dict)}
+
 BLOCK_PALETTE = {} # Will be loaded in main
+BLOCK_FACES = {} # Will be loaded in main
 
 def load_skin(path):
+    """
+    The skin as a 64x64 RGBA image, from a path or a binary file object.
+
+    :raises ValueError: if the image cannot be read, without the path in its message (the caller knows it)
+    """
     try:
         img = Image.open(path).convert("RGBA")
-        if img.size != (64, 64):
-            print(f"Warning: Skin size is {img.size}, expected (64, 64). Resizing...")
-            img = img.resize((64, 64))
-        return img
-    except Exception as e:
-        print(f"Error loading skin: {e}")
-        sys.exit(1)
+    except UnidentifiedImageError as e:
+        raise ValueError("Cannot read skin image: not a recognized image format") from e
+    except OSError as e:
+        raise ValueError(f"Cannot read skin image: {e.strerror or e}") from e
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"Cannot read skin image: {e}") from e
+    if img.size != (64, 64):
+        print(f"Warning: Skin size is {img.size}, expected (64, 64). Resizing...")
+        img = img.resize((64, 64))
+    return img
 
 def find_closest_block(rgba, palette):
     r, g, b, a = rgba
@@ -54,9 +86,194 @@ def find_closest_block(rgba, palette):
             
     return closest_block
 
-def build_statue_data(skin_image):
+# We will iterate through 3D coordinates of the statue and map to 2D skin coordinates
+# Statue Coordinate System:
+# x: width (left to right)
+# y: height (bottom to top)
+# z: depth (back to front)
+
+# Define parts: (name, dim_w, dim_h, dim_d, tex_u, tex_v, pos_x, pos_y, pos_z)
+# Note: pos is bottom-left-back corner of the part in the statue
+
+PARTS = [
+    # Head (8x8x8) - Top
+    {"w": 8, "h": 8, "d": 8, "u": 0, "v": 0, "x": 4, "y": 24, "z": 2, "overlay_u": 32, "overlay_v": 0},
+    # Body (8x12x4) - Center
+    {"w": 8, "h": 12, "d": 4, "u": 16, "v": 16, "x": 4, "y": 12, "z": 4, "overlay_u": 16, "overlay_v": 32},
+    # Right Arm (4x12x4) - Left side of statue
+    {"w": 4, "h": 12, "d": 4, "u": 40, "v": 16, "x": 0, "y": 12, "z": 4, "overlay_u": 40, "overlay_v": 32},
+    # Left Arm (4x12x4) - Right side of statue
+    {"w": 4, "h": 12, "d": 4, "u": 32, "v": 48, "x": 12, "y": 12, "z": 4, "overlay_u": 48, "overlay_v": 48},
+    # Right Leg (4x12x4) - Left side of statue
+    {"w": 4, "h": 12, "d": 4, "u": 0, "v": 16, "x": 4, "y": 0, "z": 4, "overlay_u": 0, "overlay_v": 32},
+    # Left Leg (4x12x4) - Right side of statue
+    {"w": 4, "h": 12, "d": 4, "u": 16, "v": 48, "x": 8, "y": 0, "z": 4, "overlay_u": 0, "overlay_v": 48},
+]
+
+
+def part_faces(w, h, d):
+    # Texture layout offsets for a box:
+    # Top: (d, 0) size (w, d)
+    # Bottom: (d + w, 0) size (w, d)
+    # Right: (0, d) size (d, h)
+    # Front: (d, d) size (w, h)
+    # Left: (d + w, d) size (d, h)
+    # Back: (d + w + d, d) size (w, h)
+    
+    return [
+        # (face_name, u_off, v_off, width_on_tex, height_on_tex, map_func)
+        # map_func takes (u, v) on texture and returns (x, y, z) relative to part origin
+        
+        # Front (z=d-1)
+        ("front", d, d, w, h, lambda u, v: (u, h - 1 - v, d - 1)),
+        # Back (z=0)
+        ("back", d + w + d, d, w, h, lambda u, v: (w - 1 - u, h - 1 - v, 0)),
+        # Right (x=0) - Viewer's left
+        ("right", 0, d, d, h, lambda u, v: (0, h - 1 - v, u)), # u maps to z? No, u is depth. 
+        # Texture Right face: left side of the cube. 
+        # If we look at front, Right face is on the left (x=0).
+        # Texture u goes from back to front? 
+        # Standard: Right face is at x=0. u=0 is back, u=d-1 is front.
+        # Let's verify standard skin mapping.
+        # Right face texture: (0, d) to (d, d+h). 
+        # It maps to the right side of the body part (from the character's perspective), which is x=w-1?
+        # No, "Right Arm" means the arm on the right side of the body.
+        # But in the texture, "Right" face usually means the face pointing Right (x+).
+        # Let's stick to standard unfolding.
+        # Box unfolding:
+        #  Top
+        # Right Front Left Back
+        #  Bottom
+        
+        # Right Face (x=w-1)
+        ("right_face", 0, d, d, h, lambda u, v: (w - 1, h - 1 - v, d - 1 - u)), 
+        # Wait, this is tricky. Let's assume standard mapping:
+        # Face Right (Outer Right of Right Arm, Inner Right of Left Arm? No.)
+        # Let's just map all 6 faces.
+        
+        # Top (y=h-1)
+        ("top", d, 0, w, d, lambda u, v: (u, h - 1, d - 1 - v)),
+        # Bottom (y=0)
+        ("bottom", d + w, 0, w, d, lambda u, v: (w - 1 - u, 0, v)),
+        # Right (x=w-1)
+        ("right", d + w, d, d, h, lambda u, v: (w - 1, h - 1 - v, d - 1 - u)), # This is actually Left face in texture layout usually?
+        # Let's re-verify texture layout.
+        # 1.8 Skin:
+        # [Right] [Front] [Left] [Back]
+        # x: 0..d  d..d+w  d+w..d+w+d  d+w+d..d+w+d+w
+        
+        # So:
+        # 0: Right Face (x=0 for Right Arm? No, Right Face of the cube)
+        # If I am the character, my Right arm is on the right. The "Right" face of the arm points away from body.
+        # Let's assume standard cuboid mapping:
+        # Face 1: Right (x=0? or x=w?)
+        # Face 2: Front (z=front)
+        # Face 3: Left
+        # Face 4: Back
+        
+        # Correct 1.8 mapping:
+        # (u, v)
+        # Top: (d, 0)
+        # Bottom: (d+w, 0)
+        # Right (x=max): (0, d) ? No, usually Right is x=min or x=max depending on perspective.
+        # Let's use the "Front" as anchor. Front is (d, d).
+        # To the left of Front (in texture) is Right Face. (0, d).
+        # To the right of Front (in texture) is Left Face. (d+w, d).
+        # To the right of Left is Back. (d+w+d, d).
+        
+        # So:
+        # Texture Right (0, d) -> Physical Right (x=w-1)? Or Physical Left (x=0)?
+        # If Front is z=max.
+        # Then Right of Front is x=max (Viewer's right).
+        # But in texture, "Right" is to the left of "Front".
+        # So (0, d) is likely the face at x=0 (Viewer's Left).
+        
+         # Face at x=0 (Left from viewer, Right from character)
+        ("face_x0", 0, d, d, h, lambda u, v: (0, h - 1 - v, u)), # z goes 0..d
+        
+        # Face at z=d-1 (Front)
+        ("face_z_front", d, d, w, h, lambda u, v: (u, h - 1 - v, d - 1)),
+        
+        # Face at x=w-1 (Right from viewer, Left from character)
+        ("face_xw", d + w, d, d, h, lambda u, v: (w - 1, h - 1 - v, d - 1 - u)), # z goes d..0?
+        
+        # Face at z=0 (Back)
+        ("face_z_back", d + w + d, d, w, h, lambda u, v: (w - 1 - u, h - 1 - v, 0)),
+    ]
+
+
+def face_rects():
+    """
+    Every distinct face rectangle (u, v, width, height) of the base and overlay layers,
+    mapped to the direction the statue surface it lands on faces (+z is south).
+    """
+    rects = {}
+    for part in PARTS:
+        w, h, d = part["w"], part["h"], part["d"]
+        facings = {(d, 0): "up", (d + w, 0): "down", (0, d): "west", (d, d): "south",
+                   (d + w, d): "east", (d + w + d, d): "north"}
+        for layer_u, layer_v in ((part["u"], part["v"]), (part["overlay_u"], part["overlay_v"])):
+            for _, u_off, v_off, fw, fh, _ in part_faces(w, h, d):
+                rects.setdefault((layer_u + u_off, layer_v + v_off, fw, fh), facings[(u_off, v_off)])
+    return rects
+
+
+FACE_FACINGS = face_rects()
+FACE_RECTS = list(FACE_FACINGS)
+
+
+def _match_texture(rgba, rects, matcher, dither):
+    if dither in (None, "none"):
+        indices = matcher.match(rgba[..., :3])
+        indices[rgba[..., 3] < ALPHA_THRESHOLD] = -1
+    else:
+        indices = dither_texture(rgba, rects, matcher, dither)
+    # Index -1 selects the trailing air entry
+    block_ids = np.array(matcher.block_ids + ["minecraft:air"], dtype=object)
+    return block_ids[indices]
+
+
+def map_skin_blocks(skin_image, palette, dither="none", max_blocks=None, profile=None,
+                    facing_aware=False, shading=1.0, noise_weight=0.0):
+    """
+    Maps every texel of the skin to a block id in one vectorized pass.
+    With a dithering mode, each face of the texture is dithered separately.
+    With a profile, only the blocks that palette profile allows are used.
+    With ``max_blocks``, only the best ``max_blocks`` of those blocks for this skin are used.
+    With ``facing_aware``, each face is matched against the shaded block faces seen from its direction,
+    and block ids may carry states (e.g. ``minecraft:oak_log[axis=x]``).
+    With ``noise_weight``, blocks with noisy textures are penalized by their texture variance times that weight.
+
+    :returns: an array of block ids indexed as [v, u], "minecraft:air" for transparent texels
+    """
+    rgba = np.asarray(skin_image.convert("RGBA"), dtype=np.uint8)
+    if profile:
+        palette = get_profile_palette(palette, profile)
+    penalties = noise_penalties(palette, BLOCK_FACES, noise_weight) if noise_weight else None
+    matcher = get_matcher(palette, penalties)
+    if max_blocks is not None:
+        matcher = reduce_matcher(rgba, FACE_RECTS, matcher, max_blocks)
+    if not facing_aware:
+        return _match_texture(rgba, FACE_RECTS, matcher, dither)
+
+    facing_matchers = get_facing_matchers(palette, BLOCK_FACES, shading, noise_weight)
+    if max_blocks is not None:
+        facing_matchers = facing_matchers.restrict(matcher.block_ids)
+    block_map = np.full(rgba.shape[:2], "minecraft:air", dtype=object)
+    for facing in FACINGS:
+        rects = [rect for rect, rect_facing in FACE_FACINGS.items() if rect_facing == facing]
+        facing_map = _match_texture(rgba, rects, facing_matchers[facing], dither)
+        for u, v, w, h in rects:
+            block_map[v:v + h, u:u + w] = facing_map[v:v + h, u:u + w]
+    return block_map
+
+
+def build_statue_data(skin_image, dither="none", max_blocks=None, profile=None, facing_aware=False, shading=1.0,
+                      noise_weight=0.0):
     pixels = skin_image.load()
     statue_blocks = {} # (x, y, z) -> block_id
+    block_map = map_skin_blocks(skin_image, BLOCK_PALETTE, dither, max_blocks, profile, facing_aware, shading,
+                                noise_weight)
 
     # Helper to add a box of blocks
     def add_part(start_x, start_y, width, height, depth, texture_u, texture_v, offset_x, offset_y, offset_z, is_overlay=False):
@@ -78,131 +295,19 @@ def build_statue_data(skin_image):
                 # Let's use specific texture coordinates for each face to be safe
                 pass
 
-    # We will iterate through 3D coordinates of the statue and map to 2D skin coordinates
-    # Statue Coordinate System:
-    # x: width (left to right)
-    # y: height (bottom to top)
-    # z: depth (back to front)
-    
-    # Define parts: (name, dim_w, dim_h, dim_d, tex_u, tex_v, pos_x, pos_y, pos_z)
-    # Note: pos is bottom-left-back corner of the part in the statue
-    
-    parts = [
-        # Head (8x8x8) - Top
-        {"w": 8, "h": 8, "d": 8, "u": 0, "v": 0, "x": 4, "y": 24, "z": 2, "overlay_u": 32, "overlay_v": 0},
-        # Body (8x12x4) - Center
-        {"w": 8, "h": 12, "d": 4, "u": 16, "v": 16, "x": 4, "y": 12, "z": 4, "overlay_u": 16, "overlay_v": 32},
-        # Right Arm (4x12x4) - Left side of statue
-        {"w": 4, "h": 12, "d": 4, "u": 40, "v": 16, "x": 0, "y": 12, "z": 4, "overlay_u": 40, "overlay_v": 32},
-        # Left Arm (4x12x4) - Right side of statue
-        {"w": 4, "h": 12, "d": 4, "u": 32, "v": 48, "x": 12, "y": 12, "z": 4, "overlay_u": 48, "overlay_v": 48},
-        # Right Leg (4x12x4) - Left side of statue
-        {"w": 4, "h": 12, "d": 4, "u": 0, "v": 16, "x": 4, "y": 0, "z": 4, "overlay_u": 0, "overlay_v": 32},
-        # Left Leg (4x12x4) - Right side of statue
-        {"w": 4, "h": 12, "d": 4, "u": 16, "v": 48, "x": 8, "y": 0, "z": 4, "overlay_u": 0, "overlay_v": 48},
-    ]
-
-    for part in parts:
+    for part in PARTS:
         w, h, d = part["w"], part["h"], part["d"]
         base_u, base_v = part["u"], part["v"]
         ox, oy, oz = part["x"], part["y"], part["z"] # Origin of the part
         
-        # Texture layout offsets for a box:
-        # Top: (d, 0) size (w, d)
-        # Bottom: (d + w, 0) size (w, d)
-        # Right: (0, d) size (d, h)
-        # Front: (d, d) size (w, h)
-        # Left: (d + w, d) size (d, h)
-        # Back: (d + w + d, d) size (w, h)
-        
-        faces = [
-            # (face_name, u_off, v_off, width_on_tex, height_on_tex, map_func)
-            # map_func takes (u, v) on texture and returns (x, y, z) relative to part origin
-            
-            # Front (z=d-1)
-            ("front", d, d, w, h, lambda u, v: (u, h - 1 - v, d - 1)),
-            # Back (z=0)
-            ("back", d + w + d, d, w, h, lambda u, v: (w - 1 - u, h - 1 - v, 0)),
-            # Right (x=0) - Viewer's left
-            ("right", 0, d, d, h, lambda u, v: (0, h - 1 - v, u)), # u maps to z? No, u is depth. 
-            # Texture Right face: left side of the cube. 
-            # If we look at front, Right face is on the left (x=0).
-            # Texture u goes from back to front? 
-            # Standard: Right face is at x=0. u=0 is back, u=d-1 is front.
-            # Let's verify standard skin mapping.
-            # Right face texture: (0, d) to (d, d+h). 
-            # It maps to the right side of the body part (from the character's perspective), which is x=w-1?
-            # No, "Right Arm" means the arm on the right side of the body.
-            # But in the texture, "Right" face usually means the face pointing Right (x+).
-            # Let's stick to standard unfolding.
-            # Box unfolding:
-            #  Top
-            # Right Front Left Back
-            #  Bottom
-            
-            # Right Face (x=w-1)
-            ("right_face", 0, d, d, h, lambda u, v: (w - 1, h - 1 - v, d - 1 - u)), 
-            # Wait, this is tricky. Let's assume standard mapping:
-            # Face Right (Outer Right of Right Arm, Inner Right of Left Arm? No.)
-            # Let's just map all 6 faces.
-            
-            # Top (y=h-1)
-            ("top", d, 0, w, d, lambda u, v: (u, h - 1, d - 1 - v)),
-            # Bottom (y=0)
-            ("bottom", d + w, 0, w, d, lambda u, v: (w - 1 - u, 0, v)),
-            # Right (x=w-1)
-            ("right", d + w, d, d, h, lambda u, v: (w - 1, h - 1 - v, d - 1 - u)), # This is actually Left face in texture layout usually?
-            # Let's re-verify texture layout.
-            # 1.8 Skin:
-            # [Right] [Front] [Left] [Back]
-            # x: 0..d  d..d+w  d+w..d+w+d  d+w+d..d+w+d+w
-            
-            # So:
-            # 0: Right Face (x=0 for Right Arm? No, Right Face of the cube)
-            # If I am the character, my Right arm is on the right. The "Right" face of the arm points away from body.
-            # Let's assume standard cuboid mapping:
-            # Face 1: Right (x=0? or x=w?)
-            # Face 2: Front (z=front)
-            # Face 3: Left
-            # Face 4: Back
-            
-            # Correct 1.8 mapping:
-            # (u, v)
-            # Top: (d, 0)
-            # Bottom: (d+w, 0)
-            # Right (x=max): (0, d) ? No, usually Right is x=min or x=max depending on perspective.
-            # Let's use the "Front" as anchor. Front is (d, d).
-            # To the left of Front (in texture) is Right Face. (0, d).
-            # To the right of Front (in texture) is Left Face. (d+w, d).
-            # To the right of Left is Back. (d+w+d, d).
-            
-            # So:
-            # Texture Right (0, d) -> Physical Right (x=w-1)? Or Physical Left (x=0)?
-            # If Front is z=max.
-            # Then Right of Front is x=max (Viewer's right).
-            # But in texture, "Right" is to the left of "Front".
-            # So (0, d) is likely the face at x=0 (Viewer's Left).
-            
-             # Face at x=0 (Left from viewer, Right from character)
-            ("face_x0", 0, d, d, h, lambda u, v: (0, h - 1 - v, u)), # z goes 0..d
-            
-            # Face at z=d-1 (Front)
-            ("face_z_front", d, d, w, h, lambda u, v: (u, h - 1 - v, d - 1)),
-            
-            # Face at x=w-1 (Right from viewer, Left from character)
-            ("face_xw", d + w, d, d, h, lambda u, v: (w - 1, h - 1 - v, d - 1 - u)), # z goes d..0?
-            
-            # Face at z=0 (Back)
-            ("face_z_back", d + w + d, d, w, h, lambda u, v: (w - 1 - u, h - 1 - v, 0)),
-        ]
+        faces = part_faces(w, h, d)
         
         # Process Base Layer
         for name, u_off, v_off, fw, fh, map_func in faces:
             for u in range(fw):
                 for v in range(fh):
-                    color = pixels[base_u + u_off + u, base_v + v_off + v]
                     bx, by, bz = map_func(u, v)
-                    block = find_closest_block(color, BLOCK_PALETTE)
+                    block = block_map[base_v + v_off + v, base_u + u_off + u]
                     if block != "minecraft:air":
                         statue_blocks[(ox + bx, oy + by, oz + bz)] = block
 
@@ -212,9 +317,8 @@ def build_statue_data(skin_image):
         for name, u_off, v_off, fw, fh, map_func in faces:
             for u in range(fw):
                 for v in range(fh):
-                    color = pixels[overlay_u + u_off + u, overlay_v + v_off + v]
                     bx, by, bz = map_func(u, v)
-                    block = find_closest_block(color, BLOCK_PALETTE)
+                    block = block_map[overlay_v + v_off + v, overlay_u + u_off + u]
                     if block != "minecraft:air":
                         # Overlay replaces base if not transparent
                         # Or we could put it in front?
@@ -246,59 +350,126 @@ def build_statue_data(skin_image):
 
     return statue_blocks
 
-def generate_litematic(statue_blocks, output_path):
+# Direction the statue surface faces, per side of a part
+_PUFF = {"face_z_front": (0, 0, 1), "face_z_back": (0, 0, -1), "face_x0": (-1, 0, 0), "face_xw": (1, 0, 0),
+         "top": (0, 1, 0), "bottom": (0, -1, 0)}
+
+@lru_cache(maxsize=None)
+def texel_voxel_map():
+    """
+    Every texel-to-voxel write of :func:`build_statue_data`, in the order it makes them:
+    a voxel ends up with the block of the last non-transparent texel written to it.
+
+    :returns: int arrays (v, u, x, y, z), one entry per write
+    """
+    writes = []
+    for part in PARTS:
+        ox, oy, oz = part["x"], part["y"], part["z"]
+        faces = part_faces(part["w"], part["h"], part["d"])
+        for layer_u, layer_v, overlay in ((part["u"], part["v"], False), (part["overlay_u"], part["overlay_v"], True)):
+            for name, u_off, v_off, fw, fh, map_func in faces:
+                px, py, pz = _PUFF.get(name, (0, 0, 0)) if overlay else (0, 0, 0)
+                for u in range(fw):
+                    for v in range(fh):
+                        bx, by, bz = map_func(u, v)
+                        writes.append((layer_v + v_off + v, layer_u + u_off + u, ox + bx + px, oy + by + py, oz + bz + pz))
+    return tuple(np.array(writes, dtype=np.int64).T)
+
+def export_statue(statue_blocks, output_path, fmt="litematic", scale=1, compresslevel=DEFAULT_COMPRESSLEVEL, threads=1,
+                  deterministic=False, thumbnail=None):
+    """
+    Encodes the statue once as a voxel grid (each block a ``scale``³ cube, chunked for large statues) and saves it
+    in one of EXPORT_FORMATS, gzipped at ``compresslevel`` on ``threads`` threads; ``deterministic`` output is
+    byte-identical for identical statues and options (see :func:`export_formats.save_grid`).
+    A .litematic carries an isometric thumbnail of the statue, also saved as a PNG at ``thumbnail`` if given.
+    """
     if not statue_blocks:
         print("No blocks generated!")
         return
 
-    # Determine bounds
-    min_x = min(k[0] for k in statue_blocks)
-    max_x = max(k[0] for k in statue_blocks)
-    min_y = min(k[1] for k in statue_blocks)
-    max_y = max(k[1] for k in statue_blocks)
-    min_z = min(k[2] for k in statue_blocks)
-    max_z = max(k[2] for k in statue_blocks)
-    
-    width = max_x - min_x + 1
-    height = max_y - min_y + 1
-    length = max_z - min_z + 1
-    
-    print(f"Statue Dimensions: {width}x{height}x{length}")
-    
-    reg = litemapy.Region(0, 0, 0, width, height, length)
-    schem = litemapy.Schematic(name="SkinStatue", author="Antigravity", regions={ "Main": reg })
-    
-    for (x, y, z), block_id in statue_blocks.items():
-        # Adjust to region coordinates (0,0,0 based)
-        rx = x - min_x
-        ry = y - min_y
-        rz = z - min_z
-        
-        try:
-            reg.setblock(rx, ry, rz, litemapy.BlockState(block_id))
-        except Exception as e:
-            print(f"Error setting block {block_id} at {rx},{ry},{rz}: {e}")
+    grid = VoxelGrid.from_statue_blocks(statue_blocks)
+    preview = None
+    if fmt == "litematic" or thumbnail:
+        # Drawn before scaling: a scaled statue looks the same
+        image = render_preview([grid], BLOCK_PALETTE)
+        preview = preview_image_data(image)
+        if thumbnail:
+            image.save(thumbnail)
+    if fmt != "datapack" and grid.volume * scale ** 3 >= SPARSE_MIN_VOLUME:
+        # Mostly air at large scales: keep only the chunks holding blocks
+        grid = ChunkedGrid.from_grid(grid, scale)
+    else:
+        grid = grid.scaled(scale)
+    print(f"Statue Dimensions: {grid.width}x{grid.height}x{grid.length}")
 
-    schem.save(output_path)
-    print(f"Saved litematic to {output_path}")
+    save_grid(grid, output_path, fmt, compresslevel, threads, deterministic, preview)
+    print(f"Saved {fmt} to {output_path}")
+
+def generate_litematic(statue_blocks, output_path):
+    export_statue(statue_blocks, output_path, "litematic")
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python skin_to_litematic.py <skin.png> [output.litematic]")
-        sys.exit(1)
-        
-    skin_path = sys.argv[1]
-    output_path = sys.argv[2] if len(sys.argv) > 2 else skin_path.replace(".png", ".litematic")
+    parser = argparse.ArgumentParser(description="Convert a Minecraft skin into a Litematica statue.")
+    parser.add_argument("skin", help="path to the skin .png")
+    parser.add_argument("output", nargs="?", help="output path (defaults to the skin name with the format's extension)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="litematic",
+                        help="litematic (Litematica), schem (Sponge v2, WorldEdit) or nbt (vanilla structure)")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="build every voxel as a SCALE x SCALE x SCALE cube of blocks (default 1)")
+    parser.add_argument("--compression-level", type=int, default=DEFAULT_COMPRESSLEVEL,
+                        help=f"gzip level from 0 (none) and 1 (fastest) to 9 (smallest), default {DEFAULT_COMPRESSLEVEL}")
+    parser.add_argument("--compression-threads", type=int, default=1,
+                        help="threads compressing the output (default 1, 0 = one per CPU for large statues)")
+    parser.add_argument("--deterministic", action="store_true",
+                        help="byte-reproducible output: fixed timestamps (SOURCE_DATE_EPOCH or 0) instead of the current time")
+    parser.add_argument("--thumbnail", metavar="PNG", help="also save the isometric preview of the statue as a PNG")
+    parser.add_argument("--dither", choices=DITHER_MODES, default="none",
+                        help="dithering applied per face before matching colors to blocks")
+    parser.add_argument("--max-blocks", type=int, metavar="K",
+                        help="use at most K distinct block types, chosen to best fit this skin")
+    parser.add_argument("--profile", choices=sorted(get_palette_profiles()),
+                        help="only use the blocks allowed by this palette profile")
+    parser.add_argument("--facing-aware", action="store_true",
+                        help="match each statue side against the block faces seen from that side, "
+                             "including in-game directional shading")
+    parser.add_argument("--shading", type=float, default=1.0,
+                        help="strength of the directional shading used by --facing-aware, from 0 to 1 (default 1)")
+    parser.add_argument("--noise-weight", type=float, default=0.0,
+                        help="penalty per unit of block texture variance, to avoid noisy blocks "
+                             "like gravel or ores (default 0, needs a palette from build_palette.py)")
+    args = parser.parse_args()
+    if not 0 <= args.compression_level <= 9:
+        parser.error("--compression-level must be between 0 and 9")
+    if args.compression_threads < 0:
+        parser.error("--compression-threads must not be negative")
+    if args.scale < 1:
+        parser.error("--scale must be at least 1")
+    if args.max_blocks is not None and args.max_blocks < 1:
+        parser.error("--max-blocks must be at least 1")
+    if not 0.0 <= args.shading <= 1.0:
+        parser.error("--shading must be between 0 and 1")
+    if args.noise_weight < 0:
+        parser.error("--noise-weight must not be negative")
+
+    skin_path = args.skin
+    output_path = args.output or skin_path.replace(".png", EXPORT_FORMATS[args.format])
     
     print(f"Loading skin from {skin_path}...")
-    img = load_skin(skin_path)
+    try:
+        img = load_skin(skin_path)
+    except ValueError as e:
+        print(f"Error loading skin: {e}")
+        sys.exit(1)
     
     print("Loading block palette...")
     BLOCK_PALETTE = get_block_palette()
+    BLOCK_FACES = get_block_faces()
     print(f"Loaded {len(BLOCK_PALETTE)} blocks in palette.")
     
     print("Building statue data...")
-    data = build_statue_data(img)
+    data = build_statue_data(img, dither=args.dither, max_blocks=args.max_blocks, profile=args.profile,
+                             facing_aware=args.facing_aware, shading=args.shading, noise_weight=args.noise_weight)
     
-    print("Generating litematic...")
-    generate_litematic(data, output_path)
+    print(f"Generating {args.format}...")
+    export_statue(data, output_path, args.format, args.scale, args.compression_level, args.compression_threads,
+                  args.deterministic, args.thumbnail)
@@ -1,25 +1,27 @@
 import sys
-import litemapy
+import numpy as np
+from litematic_reader import Litematic
 
 def verify_litematic(path):
     try:
-        schem = litemapy.Schematic.load(path)
+        schem = Litematic.load(path)
+        regions = schem.regions
         print(f"Successfully loaded {path}")
         
-        reg = list(schem.regions.values())[0]
-        print(f"Region Name: {list(schem.regions.keys())[0]}")
-        print(f"Dimensions: {reg.width}x{reg.height}x{reg.length}")
+        reg = list(regions.values())[0]
+        print(f"Region Name: {list(regions.keys())[0]}")
+        print("Dimensions: {}x{}x{}".format(*reg.shape))
         
         block_count = 0
         blocks = {}
         
-        for x in range(reg.width):
-            for y in range(reg.height):
-                for z in range(reg.length):
-                    block = reg.getblock(x, y, z)
-                    if block.blockid != "minecraft:air":
-                        block_count += 1
-                        blocks[block.blockid] = blocks.get(block.blockid, 0) + 1
+        # Count every palette entry at once, then group block states by block id
+        counts = np.bincount(reg.blocks.ravel(), minlength=len(reg.palette))
+        for identifier, count in zip(reg.palette, counts.tolist()):
+            block_id = identifier.partition("[")[0]
+            if block_id != "minecraft:air" and count:
+                block_count += count
+                blocks[block_id] = blocks.get(block_id, 0) + count
                         
         print(f"Total non-air blocks: {block_count}")
         print("Block distribution:")
@@ -0,0 +1,357 @@
+from functools import lru_cache
+from itertools import product
+from math import ceil, log2
+
+import litemapy
+import numpy as np
+
+AIR = "minecraft:air"
+
+# Values bit-packed per step; a multiple of 64 so every step starts on a word boundary
+PACK_CHUNK = 1 << 16
+
+# Edge of the cubic chunks of a ChunkedGrid
+CHUNK_SIZE = 16
+
+# Scaled statues from this many voxels up are built as a ChunkedGrid instead of a dense array
+SPARSE_MIN_VOLUME = 1 << 22
+
+
+def index_dtype(palette_size):
+    """Smallest unsigned dtype holding the indices of a palette of ``palette_size`` entries."""
+    for dtype in (np.uint8, np.uint16):
+        if palette_size <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.uint32
+
+
+class InternedBlockState(litemapy.BlockState):
+    """
+    A canonical BlockState from :func:`intern_block_state`: equal states are the same object, so identity
+    settles most comparisons. Pickled states are interned again when loaded (e.g. in process pools).
+    The hash and the NBT compound are computed once.
+    """
+
+    def __init__(self, block_id, **properties):
+        super().__init__(block_id, **properties)
+        self._hash = super().__hash__()
+        self._nbt = super().to_nbt()
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, InternedBlockState) and self._hash != other._hash:
+            return False
+        return super().__eq__(other)
+
+    def __reduce__(self):
+        return _unpickle_block_state, (self.id, dict(self.properties()))
+
+    def __hash__(self):
+        return self._hash
+
+    def to_nbt(self):
+        """The cached palette compound, shared by every caller: do not modify it."""
+        return self._nbt
+
+    def with_id(self, block_id):
+        return intern_block_state(block_id, **dict(self.properties()))
+
+    def with_properties(self, **properties):
+        merged = dict(self.properties())
+        merged.update(properties)
+        return intern_block_state(self.id, **{k: v for k, v in merged.items() if v is not None})
+
+
+_INTERNED = {}
+
+
+def intern_block_state(block_id, **properties):
+    """The one :class:`InternedBlockState` of a block id and properties, whatever the property order."""
+    key = (block_id, tuple(sorted(properties.items())))
+    state = _INTERNED.get(key)
+    if state is None:
+        state = _INTERNED[key] = InternedBlockState(block_id, **properties)
+    return state
+
+
+def _unpickle_block_state(block_id, properties):
+    return intern_block_state(block_id, **properties)
+
+
+@lru_cache(maxsize=None)
+def block_state(identifier):
+    """Parses a block state identifier such as ``minecraft:oak_log[axis=x]`` into an interned BlockState."""
+    block_id, _, state = identifier.partition("[")
+    properties = dict(prop.split("=", 1) for prop in state.rstrip("]").split(",") if prop)
+    return intern_block_state(block_id, **properties)
+
+
+def _pack_words(values, nbits):
+    """Bit-packs values whose count is a multiple of 64 (or the final values of the stream) into words."""
+    shifts = np.arange(nbits, dtype=np.uint64)
+    words = np.zeros(-(-len(values) * nbits // 64), dtype=np.uint64)
+    for start in range(0, len(values), PACK_CHUNK):
+        bits = ((values[start:start + PACK_CHUNK, None] >> shifts) & 1).astype(np.uint8)
+        packed = np.packbits(bits.ravel(), bitorder="little")
+        padded = np.zeros(-(-len(packed) // 8) * 8, dtype=np.uint8)
+        padded[:len(packed)] = packed
+        first = start * nbits // 64
+        words[first:first + len(padded) // 8] = padded.view("<u8")
+    return words
+
+
+def iter_packed_words(value_chunks, nbits):
+    """
+    Packs a stream of non-negative integer arrays the way Litematica does:
+    value ``i`` occupies bits ``i * nbits`` to ``(i + 1) * nbits - 1`` of the little-endian bit stream,
+    possibly spanning two words.
+
+    :returns: an iterator of uint64 word arrays
+    """
+    carry = np.empty(0, dtype=np.uint64)
+    for values in value_chunks:
+        values = np.concatenate([carry, np.asarray(values, dtype=np.uint64).ravel()])
+        aligned = len(values) // 64 * 64
+        carry = values[aligned:]
+        if aligned:
+            yield _pack_words(values[:aligned], nbits)
+    if len(carry):
+        yield _pack_words(carry, nbits)
+
+
+def pack_bits(values, nbits):
+    """Packs non-negative integers into Litematica's 64-bit words (see :func:`iter_packed_words`)."""
+    return np.concatenate([np.empty(0, dtype=np.uint64), *iter_packed_words([values], nbits)])
+
+
+def unpack_bits(words, count, nbits):
+    """
+    The first ``count`` values packed in Litematica words (inverse of :func:`pack_bits`).
+    ``words`` may be signed or unsigned, in either byte order, as stored in NBT.
+
+    :returns: uint32 values
+    """
+    data = np.asarray(words).astype("<u8").view(np.uint8)
+    weights = (1 << np.arange(nbits)).astype(np.uint32)
+    values = np.empty(count, dtype=np.uint32)
+    for start in range(0, count, PACK_CHUNK):
+        size = min(PACK_CHUNK, count - start)
+        first = start * nbits // 8
+        bits = np.unpackbits(data[first:first + -(-size * nbits // 8)], bitorder="little")
+        values[start:start + size] = bits[:size * nbits].reshape(size, nbits) @ weights
+    return values
+
+
+def packed_length(count, nbits):
+    """Number of 64-bit words holding ``count`` values of ``nbits`` bits."""
+    return -(-count * nbits // 64)
+
+
+def varint_size(values):
+    """Total number of bytes of the LEB128 varints of the given values."""
+    values = np.asarray(values, dtype=np.uint32)
+    return int(len(values) + sum(np.count_nonzero(values >= (1 << (7 * k))) for k in range(1, 5)))
+
+
+def encode_varints(values):
+    """Encodes non-negative integers as consecutive LEB128 varints (7 bits per byte, high bit = more bytes)."""
+    values = np.asarray(values, dtype=np.uint32).ravel()
+    if len(values) == 0 or values.max() < 0x80:
+        return values.astype(np.uint8)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 5):
+        lengths += values >= (1 << (7 * k))
+    starts = np.cumsum(lengths) - lengths
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max())):
+        sel = np.nonzero(lengths > k)[0]
+        more = (lengths[sel] > k + 1).astype(np.uint32) << 7
+        out[starts[sel] + k] = ((values[sel] >> (7 * k)) & 0x7F) | more
+    return out
+
+
+class VoxelGrid:
+    """
+    A statue as a dense array of palette indices indexed [x, y, z], with air at index 0,
+    in the smallest dtype holding the palette (see :func:`index_dtype`).
+    Every export format is encoded from this one array instead of walking voxels.
+    """
+
+    def __init__(self, blocks, palette, origin=(0, 0, 0)):
+        self.blocks = blocks
+        self.palette = palette
+        self.origin = origin
+
+    @classmethod
+    def from_statue_blocks(cls, statue_blocks):
+        """
+        Builds the grid from ``{(x, y, z): block_identifier}``, cropped to the statue's bounds.
+        The palette is air followed by the block identifiers in sorted order.
+        """
+        coords = np.array(list(statue_blocks), dtype=np.int64).reshape(-1, 3)
+        if len(coords) == 0:
+            return cls(np.zeros((0, 0, 0), dtype=np.uint8), [AIR])
+        ids, inverse = np.unique(np.array(list(statue_blocks.values()), dtype=str), return_inverse=True)
+        palette = [AIR] + [str(i) for i in ids if i != AIR]
+        lut = np.array([palette.index(str(i)) for i in ids])
+        mins = coords.min(axis=0)
+        size = coords.max(axis=0) - mins + 1
+        blocks = np.zeros(tuple(size), dtype=index_dtype(len(palette)))
+        blocks[tuple((coords - mins).T)] = lut[inverse.ravel()]
+        return cls(blocks, palette, tuple(int(c) for c in mins))
+
+    @property
+    def width(self):
+        return self.blocks.shape[0]
+
+    @property
+    def height(self):
+        return self.blocks.shape[1]
+
+    @property
+    def length(self):
+        return self.blocks.shape[2]
+
+    @property
+    def volume(self):
+        return self.blocks.size
+
+    def block_count(self):
+        """Number of non-air voxels."""
+        return int(np.count_nonzero(self.blocks))
+
+    def nbits(self):
+        """Bits per index in the Litematica block state array (at least 2)."""
+        return max(ceil(log2(len(self.palette))), 2)
+
+    def read(self, lo, hi):
+        """The [x, y, z] box of palette indices from corner ``lo`` (inclusive) to ``hi`` (exclusive)."""
+        return self.blocks[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]]
+
+    def yzx_indices(self):
+        """Palette indices flattened with x varying fastest, then z, then y (``y * W * L + z * W + x``)."""
+        return self.blocks.transpose(1, 2, 0).ravel()
+
+    def iter_yzx(self, chunk=PACK_CHUNK):
+        """:meth:`yzx_indices` in slabs of whole y layers of about ``chunk`` values, copying one slab at a time."""
+        layers = max(1, chunk // max(1, self.width * self.length))
+        for y in range(0, self.height, layers):
+            yield self.blocks[:, y:y + layers, :].transpose(1, 2, 0).ravel()
+
+    def scaled(self, factor):
+        """The grid with every voxel turned into a ``factor``³ cube."""
+        if factor == 1:
+            return self
+        blocks = self.blocks
+        for axis in range(3):
+            blocks = np.repeat(blocks, factor, axis=axis)
+        return VoxelGrid(blocks, self.palette, tuple(c * factor for c in self.origin))
+
+
+class ChunkedGrid:
+    """
+    A sparse grid with the :class:`VoxelGrid` interface, for large statues whose bounding box is mostly air:
+    only the CHUNK_SIZE³ chunks holding a block are stored, so memory scales with the statue's surface.
+    Boxes are read and written chunk by chunk and the export formats stream it slab by slab;
+    only :attr:`blocks` builds the dense array.
+    """
+
+    def __init__(self, shape, palette, origin=(0, 0, 0)):
+        self.shape = tuple(int(s) for s in shape)
+        self.palette = palette
+        self.origin = origin
+        self.dtype = index_dtype(len(palette))
+        self.chunks = {}
+
+    @classmethod
+    def from_grid(cls, grid, scale=1):
+        """The grid with every voxel turned into a ``scale``³ cube, built chunk by chunk."""
+        chunked = cls([s * scale for s in grid.blocks.shape], grid.palette, tuple(c * scale for c in grid.origin))
+        for key in product(*(range(-(-s // CHUNK_SIZE)) for s in chunked.shape)):
+            lo = [k * CHUNK_SIZE for k in key]
+            hi = [min(l + CHUNK_SIZE, s) for l, s in zip(lo, chunked.shape)]
+            source = grid.read([l // scale for l in lo], [-(-h // scale) for h in hi])
+            if not source.any():
+                continue
+            chunk = np.zeros((CHUNK_SIZE,) * 3, dtype=chunked.dtype)
+            index = np.ix_(*((np.arange(l, h) // scale - l // scale) for l, h in zip(lo, hi)))
+            chunk[:hi[0] - lo[0], :hi[1] - lo[1], :hi[2] - lo[2]] = source[index]
+            chunked.chunks[key] = chunk
+        return chunked
+
+    @property
+    def width(self):
+        return self.shape[0]
+
+    @property
+    def height(self):
+        return self.shape[1]
+
+    @property
+    def length(self):
+        return self.shape[2]
+
+    @property
+    def volume(self):
+        return self.width * self.height * self.length
+
+    @property
+    def blocks(self):
+        """The whole grid as a dense array."""
+        return self.read((0, 0, 0), self.shape)
+
+    def block_count(self):
+        """Number of non-air voxels."""
+        return sum(int(np.count_nonzero(chunk)) for chunk in self.chunks.values())
+
+    def nbits(self):
+        """Bits per index in the Litematica block state array (at least 2)."""
+        return max(ceil(log2(len(self.palette))), 2)
+
+    def _overlaps(self, lo, hi):
+        """(chunk key, slices in the chunk, slices in the box) of every chunk overlapping the box."""
+        ranges = [range(l // CHUNK_SIZE, -(-h // CHUNK_SIZE)) for l, h in zip(lo, hi)]
+        for key in product(*ranges):
+            starts = [max(l, k * CHUNK_SIZE) for l, k in zip(lo, key)]
+            ends = [min(h, (k + 1) * CHUNK_SIZE) for h, k in zip(hi, key)]
+            inner = tuple(slice(s - k * CHUNK_SIZE, e - k * CHUNK_SIZE) for s, e, k in zip(starts, ends, key))
+            outer = tuple(slice(s - l, e - l) for s, e, l in zip(starts, ends, lo))
+            yield key, inner, outer
+
+    def read(self, lo, hi):
+        """The [x, y, z] box of palette indices from corner ``lo`` (inclusive) to ``hi`` (exclusive)."""
+        box = np.zeros([h - l for l, h in zip(lo, hi)], dtype=self.dtype)
+        for key, inner, outer in self._overlaps(lo, hi):
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                box[outer] = chunk[inner]
+        return box
+
+    def write(self, lo, values):
+        """Writes an [x, y, z] box of palette indices at corner ``lo``; chunks left all air are dropped."""
+        hi = [l + s for l, s in zip(lo, values.shape)]
+        for key, inner, outer in self._overlaps(lo, hi):
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                if not values[outer].any():
+                    continue
+                chunk = self.chunks[key] = np.zeros((CHUNK_SIZE,) * 3, dtype=self.dtype)
+            chunk[inner] = values[outer]
+            if not chunk.any():
+                del self.chunks[key]
+
+    def iter_yzx(self, chunk=PACK_CHUNK):
+        """
+        Palette indices in y, z, x order (see :meth:`VoxelGrid.iter_yzx`), in slabs of whole y layers
+        of about ``chunk`` values. Bands of whole chunk layers are read at once, so each chunk is copied once.
+        """
+        layers = max(1, chunk // max(1, self.width * self.length))
+        for band in range(0, self.height, CHUNK_SIZE):
+            top = min(band + CHUNK_SIZE, self.height)
+            yzx = self.read((0, band, 0), (self.width, top, self.length)).transpose(1, 2, 0)
+            for y in range(0, top - band, layers):
+                yield yzx[y:y + layers].ravel()
+
+    def to_grid(self):
+        return VoxelGrid(self.blocks, self.palette, self.origin)